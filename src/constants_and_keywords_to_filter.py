@@ -1,16 +1,21 @@
-# Note, the use of keywords List is an attempt at filtering YouTube videos by name content to reduce noise
 from src.utils.utils import root_directory
 
-AUTHORS = ['Robert Miller']
-FIRMS = ['Flashbots']
-KEYWORDS_TO_INCLUDE = ['MEV']
-
-KEYWORDS_TO_INCLUDE += AUTHORS
-KEYWORDS_TO_INCLUDE += FIRMS
-
-KEYWORDS_TO_EXCLUDE = ['#shorts']
+# Note, filtering YouTube videos by title content to reduce noise is configured in this declarative rule file:
+# keyword sets, PASSTHROUGH channels, channel-specific filters and titles not to download. See src/utils/filter_rules.py.
+FILTER_RULES_FILE_PATH = f"{root_directory()}/data/youtube_filter_rules.json"
 
 YOUTUBE_VIDEO_DIRECTORY = f"{root_directory()}/datasets/evaluation_data/diarized_youtube_content_2023-10-06/"
+# Content-addressed audio, outside of the dataset tree but on the same volume so that per-title files can be hard links into it
+AUDIO_STORE_DIRECTORY = f"{root_directory()}/datasets/evaluation_data/audio_store/"
 YOUTUBE_CHANNELS_FILE = f"{root_directory()}/data/youtube_channel_handles.txt"
 YOUTUBE_VIDEOS_CSV_FILE_PATH = f"{root_directory()}/data/links/youtube/youtube_videos.csv"
 MAPPING_FILE_PATH = f"{root_directory()}/data/links/youtube/youtube_video_mapping.csv"
+ARTIFACT_INDEX_FILE_PATH = f"{root_directory()}/data/links/youtube/artifact_index.jsonl"
+CHANNEL_SYNC_STATE_FILE_PATH = f"{root_directory()}/data/links/youtube/channel_sync_state.json"
+QUOTA_LEDGER_FILE_PATH = f"{root_directory()}/data/links/youtube/youtube_api_quota.json"
+FILTER_RULES_STATE_FILE_PATH = f"{root_directory()}/data/links/youtube/filter_rules_state.json"
+FILTERED_AWAY_CSV_FILE_PATH = f"{root_directory()}/data/links/youtube/filtered_away_youtube_videos.csv"
+VIDEO_METADATA_CACHE_FILE_PATH = f"{root_directory()}/data/links/youtube/video_metadata_cache.jsonl"
+DOWNLOAD_LEDGER_FILE_PATH = f"{root_directory()}/data/links/youtube/download_ledger.jsonl"
+FS_OPERATION_JOURNAL_DIRECTORY = f"{root_directory()}/data/links/youtube/fs_journals"
+AUDIO_STORE_INDEX_FILE_PATH = f"{root_directory()}/data/links/youtube/audio_store_index.jsonl"
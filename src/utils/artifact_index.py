@@ -0,0 +1,256 @@
+import json
+import logging
+import os
+import re
+import threading
+from typing import Optional
+
+from src.constants_and_keywords_to_filter import YOUTUBE_VIDEO_DIRECTORY, ARTIFACT_INDEX_FILE_PATH
+from src.utils.transcode import AUDIO_FILE_EXTENSIONS
+
+# Suffixes written by each stage of the pipeline, longest first so that the most specific suffix is stripped
+ARTIFACT_STAGE_SUFFIXES = [
+    ('processed_txt', '_diarized_content_processed_diarized.txt'),
+    ('processed_txt', '_content_processed_diarized.txt'),
+    ('diarized_json', '_diarized_content.json'),
+] + [('mp3', extension) for extension in AUDIO_FILE_EXTENSIONS]  # Any downloaded audio, transcoded to mp3 or not
+
+_DATE_PREFIX_REGEX = re.compile(r'^\d{4}-\d{2}-\d{2}_')
+_WHITESPACE_REGEX = re.compile(r'\s+')
+
+# Leaves room for the longest stage suffix within the 255 bytes most filesystems allow per file name
+_MAX_FILE_STEM_BYTES = 200
+
+# Journals without this version were keyed by the title without its date prefix, and are rebuilt from the tree
+_INDEX_VERSION = 2
+
+
+def normalize_title_key(title: str) -> str:
+    """
+    Normalizes a video title or artifact file stem, without its date prefix, into the title part of canonical names
+    and artifact index keys.
+
+    yt-dlp writes some characters as their full-width equivalent and slashes as '⧸', while the rest of the
+    pipeline replaces slashes with underscores, so both spellings map to the same key.
+
+    Args:
+        title (str): The video title or the file name without its stage suffix.
+
+    Returns:
+        str: The normalized key.
+    """
+    title = ''.join(chr(ord(char) - 0xFEE0) if 0xFF01 <= ord(char) <= 0xFF5E else char for char in str(title))
+    title = title.replace('/', '_').replace('⧸', '_')
+    title = _DATE_PREFIX_REGEX.sub('', title)
+    return _WHITESPACE_REGEX.sub(' ', title).strip()
+
+
+def canonical_video_name(title: str, published_date: str) -> str:
+    """
+    Returns the name of a video's directory and the stem of its artifact files: '{published_date}_{title}', with
+    the title normalized like the artifact index keys, full-width characters in ASCII and slashes as underscores.
+
+    The download stage writes under this name directly, so that files never need to be renamed or moved afterwards.
+
+    Args:
+        title (str): The video title as in the catalog.
+        published_date (str): The publication date, 'yyyy-mm-dd'.
+
+    Returns:
+        str: The canonical name.
+    """
+    name = normalize_title_key(title)
+    if published_date:
+        name = f"{published_date}_{name}"
+    encoded = name.encode('utf-8')
+    if len(encoded) > _MAX_FILE_STEM_BYTES:
+        name = encoded[:_MAX_FILE_STEM_BYTES].decode('utf-8', errors='ignore').rstrip()
+    return name
+
+
+def artifact_key(file_stem: str) -> str:
+    """
+    Returns the key of an artifact file stem in the artifact index: its canonical name, date prefix included, so
+    that videos of a channel sharing a title but published on different days do not collide.
+    """
+    date_prefix = _DATE_PREFIX_REGEX.match(file_stem)
+    if date_prefix is None:
+        return canonical_video_name(file_stem, '')
+    return canonical_video_name(file_stem[date_prefix.end():], date_prefix.group()[:-1])
+
+
+def classify_artifact(file_name: str):
+    """
+    Returns the (stage, artifact key) of an artifact file name, or None if the file is not a pipeline artifact.
+    """
+    for stage, suffix in ARTIFACT_STAGE_SUFFIXES:
+        if file_name.endswith(suffix):
+            return stage, artifact_key(file_name[:-len(suffix)])
+    return None
+
+
+def _channel_of(file_path: str, base_path: str):
+    relative_path = os.path.relpath(file_path, base_path)
+    parts = relative_path.split(os.sep)
+    if len(parts) < 2 or parts[0] == '..':
+        return None
+    return parts[0]
+
+
+def record_artifact(file_path: str, base_path: str = YOUTUBE_VIDEO_DIRECTORY, index_path: str = ARTIFACT_INDEX_FILE_PATH):
+    """
+    Appends a single artifact to the on-disk index without loading it. Safe to call from worker processes since
+    each record is a single short line appended to the journal.
+
+    Args:
+        file_path (str): Path of the file that was just written.
+        base_path (str): The dataset directory containing one subdirectory per channel.
+        index_path (str): Path of the index journal.
+    """
+    channel_name = _channel_of(file_path, base_path)
+    classified = classify_artifact(os.path.basename(file_path))
+    if channel_name is None or classified is None:
+        return
+    stage, key = classified
+    if not os.path.exists(index_path):
+        # The index has never been built, the next ArtifactIndex.load() will pick this file up from the tree
+        return
+    line = ArtifactIndex._record(channel_name, key, stage, path=os.path.abspath(file_path))
+    with open(index_path, 'a', encoding='utf-8') as file:
+        file.write(line)
+
+
+class ArtifactIndex:
+    """
+    Persistent index of the artifacts present in the dataset directory, keyed by video ID, and by channel and
+    date-prefixed canonical name for the artifacts whose video ID is not known.
+
+    The index is an append-only JSON lines journal. It is built once from the tree, then updated incrementally
+    by the download, diarization and formatting stages so that "already processed?" is a dictionary lookup.
+    The download stage records its files with their video ID only, while files found in the tree and the files of
+    later stages, which only know their path, are recorded by name. Each record carries the path of its file, and a
+    video only counts as processed while one of its recorded files exists, so deleted files need no rebuild.
+    """
+
+    def __init__(self, base_path: str = YOUTUBE_VIDEO_DIRECTORY, index_path: str = ARTIFACT_INDEX_FILE_PATH):
+        self.base_path = base_path
+        self.index_path = index_path
+        self._stages = {}  # (channel_name, key) -> {stage: file path, None for records written before paths were}
+        self._stages_by_video_id = {}  # video_id -> {stage: file path}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, base_path: str = YOUTUBE_VIDEO_DIRECTORY, index_path: str = ARTIFACT_INDEX_FILE_PATH, rebuild: bool = False) -> 'ArtifactIndex':
+        """
+        Loads the index from disk, building it from the dataset tree if it does not exist yet or if rebuild is set.
+        """
+        index = cls(base_path, index_path)
+        if rebuild or not os.path.exists(index_path):
+            index.build()
+            return index
+
+        with open(index_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from an interrupted append, the file itself will be picked up on next rebuild
+                    continue
+                if record.get('v') != _INDEX_VERSION:
+                    logging.info(f"Artifact index {index_path} was written by an earlier version, rebuilding it")
+                    index.build()
+                    return index
+                index._remember(record.get('channel'), record.get('key'), record['stage'], record.get('video_id'), record.get('path'))
+        logging.info(f"Loaded artifact index with {len(index._stages) + len(index._stages_by_video_id)} videos from {index_path}")
+        return index
+
+    def _remember(self, channel_name: Optional[str], key: Optional[str], stage: str, video_id: Optional[str] = None, path: Optional[str] = None):
+        # An artifact with a video ID is only found by it, so that another video with the same name is not mistaken for it
+        if video_id:
+            self._stages_by_video_id.setdefault(video_id, {})[stage] = path
+        elif key:
+            self._stages.setdefault((channel_name, key), {})[stage] = path
+
+    @staticmethod
+    def _record(channel_name: Optional[str], key: Optional[str], stage: str, video_id: Optional[str] = None, path: Optional[str] = None) -> str:
+        record = {'channel': channel_name, 'key': key, 'stage': stage, 'v': _INDEX_VERSION} if key else {'stage': stage, 'v': _INDEX_VERSION}
+        if video_id:
+            record['video_id'] = video_id
+        if path:
+            record['path'] = path
+        return json.dumps(record, ensure_ascii=False) + '\n'
+
+    def build(self):
+        """
+        Walks the dataset tree once and rewrites the index from scratch.
+        """
+        self._stages = {}
+        self._stages_by_video_id = {}
+        if os.path.exists(self.base_path):
+            for root, _, files in os.walk(self.base_path):
+                channel_name = _channel_of(os.path.join(root, '_'), self.base_path)
+                if channel_name is None:
+                    continue
+                for file in files:
+                    classified = classify_artifact(file)
+                    if classified:
+                        stage, key = classified
+                        self._remember(channel_name, key, stage, path=os.path.abspath(os.path.join(root, file)))
+        self.compact()
+        logging.info(f"Built artifact index with {len(self._stages)} videos from {self.base_path}")
+
+    def compact(self):
+        """
+        Rewrites the journal with one line per (video, stage), atomically replacing the previous file. Video IDs are
+        only known from the journal, so compacting keeps them while build() starts over from the tree.
+        """
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with self._lock:
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                for (channel_name, key), stages in self._stages.items():
+                    for stage, path in sorted(stages.items()):
+                        file.write(self._record(channel_name, key, stage, path=path))
+                for video_id, stages in self._stages_by_video_id.items():
+                    for stage, path in sorted(stages.items()):
+                        file.write(self._record(None, None, stage, video_id, path))
+            os.replace(tmp_path, self.index_path)
+
+    def add(self, channel_name: str, title: str, stage: str, published_date: str = '', video_id: Optional[str] = None, file_path: Optional[str] = None):
+        """
+        Records that the given stage exists for a video and appends it to the journal, under the video ID if it is
+        known, otherwise under the channel and the video's date-prefixed name.
+        """
+        key = canonical_video_name(title, published_date)
+        path = os.path.abspath(file_path) if file_path else None
+        with self._lock:
+            stages = self._stages_by_video_id.get(video_id, {}) if video_id else self._stages.get((channel_name, key), {})
+            if stage in stages and stages[stage] == path:
+                return
+            self._remember(channel_name, key, stage, video_id, path)
+            with open(self.index_path, 'a', encoding='utf-8') as file:
+                file.write(self._record(channel_name, key, stage, video_id, path))
+
+    def stages(self, channel_name: str, title: str, published_date: str = '', video_id: Optional[str] = None) -> set:
+        """
+        Returns the stages recorded for the video ID, or for artifacts whose video ID is not known, those recorded
+        under the channel and the video's date-prefixed name. Stages whose file was deleted since are left out.
+        """
+        with self._lock:
+            for index, index_key in ((self._stages_by_video_id, video_id), (self._stages, (channel_name, canonical_video_name(title, published_date)))):
+                if not index_key or index_key not in index:
+                    continue
+                stages = index[index_key]
+                for stage, path in list(stages.items()):
+                    if path and not os.path.exists(path):
+                        del stages[stage]
+                if stages:
+                    return set(stages)
+                del index[index_key]
+        return set()
+
+    def is_processed(self, channel_name: str, title: str, published_date: str = '', video_id: Optional[str] = None) -> bool:
+        """
+        Returns True if any stage (.mp3, diarized .json or processed .txt) still exists for the video.
+        """
+        return bool(self.stages(channel_name, title, published_date, video_id))
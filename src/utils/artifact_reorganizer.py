@@ -0,0 +1,173 @@
+import argparse
+import logging
+import os
+import re
+import shutil
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+from src.constants_and_keywords_to_filter import YOUTUBE_VIDEO_DIRECTORY
+from src.utils.artifact_index import ARTIFACT_STAGE_SUFFIXES, artifact_key, canonical_video_name, record_artifact
+from src.utils.catalog import channel_key
+from src.utils.download import load_channel_mapping
+from src.utils.title_matcher import TitleIndex
+from src.utils.utils import root_directory
+
+ACTION_MOVE = 'move'
+ACTION_DELETE = 'delete'
+
+_DATE_PREFIX_REGEX = re.compile(r'^(\d{4}-\d{2}-\d{2})_')
+
+
+class PlannedMove(NamedTuple):
+    action: str  # ACTION_MOVE, or ACTION_DELETE for a duplicate of a file already at its destination
+    source: str
+    destination: str
+
+
+class ReorganizationPlan(NamedTuple):
+    moves: List[PlannedMove]
+    unmatched: List[str]  # Artifacts that match no catalog video closely enough, or several equally, left where they are
+    conflicts: List[PlannedMove]  # Artifacts with a canonical name whose destination is taken, never deleted automatically
+
+
+def _scan_artifacts(base_path: str) -> Iterator[Tuple[str, str, str, str]]:
+    # One os.scandir walk of the dataset tree, yielding (path, channel, stem, suffix) of every pipeline artifact
+    if not os.path.isdir(base_path):
+        return
+    with os.scandir(base_path) as channel_entries:
+        channel_dirs = [(entry.path, entry.name) for entry in channel_entries if entry.is_dir()]
+    for channel_path, channel_name in channel_dirs:
+        stack = [channel_path]
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        continue
+                    for _, suffix in ARTIFACT_STAGE_SUFFIXES:
+                        if entry.name.endswith(suffix):
+                            yield entry.path, channel_name, entry.name[:-len(suffix)], suffix
+                            break
+
+
+def _is_canonical(stem: str) -> bool:
+    # Written under its canonical name, by the download stage or an earlier reorganization
+    return _DATE_PREFIX_REGEX.match(stem) is not None and artifact_key(stem) == stem
+
+
+def plan_reorganization(base_path: str = YOUTUBE_VIDEO_DIRECTORY, catalog_csv_path: Optional[str] = None, min_score: float = 0.8) -> ReorganizationPlan:
+    """
+    Computes where every audio file, diarized json and processed txt of the dataset tree belongs, without touching it.
+
+    The catalog is loaded once and indexed by title, and the tree is walked once. Each artifact is matched to a
+    catalog video of its channel with a similar title and, if its name starts with one, the same publication date,
+    so that videos sharing a title are told apart. An artifact without a date matching videos of several dates is
+    left alone. Matched artifacts are planned to move to '{channel}/{date}_{title}/{date}_{title}{suffix}', the
+    canonical location downloads are written to. An artifact whose destination is already taken, by an existing file
+    or by another artifact of the plan, is planned for deletion as a duplicate, unless it has a canonical name itself.
+
+    Args:
+        base_path (str): The dataset directory containing one subdirectory per channel.
+        catalog_csv_path (Optional[str]): The catalog with the title and published_date of each video.
+        min_score (float): The lowest title similarity at which an artifact is moved, see TitleIndex.match.
+
+    Returns:
+        ReorganizationPlan: The planned moves and deletions, the conflicts left in place and the artifacts no video matched.
+    """
+    catalog_csv_path = catalog_csv_path or f"{root_directory()}/datasets/evaluation_data/youtube_videos.csv"
+    catalog_df = pd.read_csv(catalog_csv_path, encoding='utf-8', dtype=str, keep_default_na=False)
+    title_index = TitleIndex(catalog_df['title'].tolist())
+    published_dates = catalog_df['published_date'].tolist()
+    row_channels = [channel_key(channel_name) for channel_name in catalog_df['channel_name']]
+    catalog_channels = set(row_channels)
+    # Channel directories are named after the handle, the catalog rows carry the channel title
+    channel_mapping = load_channel_mapping()
+
+    channel_keys_per_directory = {}
+    moves, unmatched, conflicts, destinations = [], [], [], set()
+    for path, channel_name, stem, suffix in _scan_artifacts(base_path):
+        if channel_name not in channel_keys_per_directory:
+            mapped_title = (channel_mapping.get(channel_name) or {}).get('channel_name')
+            # A directory no catalog channel can be found for is matched against every channel
+            channel_keys_per_directory[channel_name] = {channel_key(channel_name), channel_key(mapped_title)} & catalog_channels or None
+        channel_keys = channel_keys_per_directory[channel_name]
+        date_prefix = _DATE_PREFIX_REGEX.match(stem)
+        date = date_prefix.group(1) if date_prefix else None
+
+        def accept(position: int) -> bool:
+            return (channel_keys is None or row_channels[position] in channel_keys) and (date is None or published_dates[position] == date)
+
+        match = title_index.match(stem, min_score=min_score, accept=accept)
+        if match is None or (date is None and len({published_dates[position] for position in title_index.positions(match.title) if accept(position)}) > 1):
+            unmatched.append(path)
+            continue
+        name = canonical_video_name(match.title, published_dates[match.position])
+        destination = os.path.join(base_path, channel_name, name, f"{name}{suffix}")
+        if os.path.normpath(path) == os.path.normpath(destination):
+            destinations.add(destination)
+            continue
+        if destination in destinations or os.path.exists(destination):
+            if _is_canonical(stem):
+                conflicts.append(PlannedMove(ACTION_DELETE, path, destination))
+            else:
+                moves.append(PlannedMove(ACTION_DELETE, path, destination))
+        else:
+            moves.append(PlannedMove(ACTION_MOVE, path, destination))
+        destinations.add(destination)
+    return ReorganizationPlan(moves, unmatched, conflicts)
+
+
+def apply_reorganization(plan: ReorganizationPlan, base_path: str = YOUTUBE_VIDEO_DIRECTORY):
+    """
+    Executes a plan, recording the moved artifacts in the artifact index and removing the directories it emptied.
+    """
+    emptied_dirs = set()
+    for move in plan.moves:
+        if move.action == ACTION_MOVE:
+            os.makedirs(os.path.dirname(move.destination), exist_ok=True)
+            shutil.move(move.source, move.destination)
+            record_artifact(move.destination, base_path)
+        else:
+            os.remove(move.source)
+        emptied_dirs.add(os.path.dirname(move.source))
+    for directory in sorted(emptied_dirs, key=len, reverse=True):
+        if os.path.normpath(os.path.dirname(directory)) != os.path.normpath(base_path) and not os.listdir(directory):
+            os.rmdir(directory)
+
+
+def format_reorganization_report(plan: ReorganizationPlan) -> str:
+    """
+    Formats a plan, one line per planned operation, per conflict and per unmatched artifact.
+    """
+    moved = sum(move.action == ACTION_MOVE for move in plan.moves)
+    lines = [f"{moved} artifacts to move, {len(plan.moves) - moved} duplicates to delete, {len(plan.conflicts)} conflicts, {len(plan.unmatched)} unmatched."]
+    for move in plan.moves:
+        if move.action == ACTION_MOVE:
+            lines.append(f"move {move.source} -> {move.destination}")
+        else:
+            lines.append(f"delete {move.source} (duplicate of {move.destination})")
+    lines.extend(f"conflict {move.source} (kept, {move.destination} already exists)" for move in plan.conflicts)
+    lines.extend(f"unmatched {path}" for path in plan.unmatched)
+    return "\n".join(lines)
+
+
+def reorganize_artifacts(base_path: str = YOUTUBE_VIDEO_DIRECTORY, catalog_csv_path: Optional[str] = None, dry_run: bool = False) -> ReorganizationPlan:
+    """
+    Moves every artifact of the dataset tree to its canonical location, or only reports the plan if dry_run is set.
+    """
+    plan = plan_reorganization(base_path, catalog_csv_path)
+    if dry_run:
+        print(format_reorganization_report(plan))
+        return plan
+    apply_reorganization(plan, base_path)
+    logging.info(format_reorganization_report(plan).split("\n", 1)[0])
+    return plan
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Move the audio, diarized json and processed txt files of the dataset tree to their canonical location.')
+    parser.add_argument('--dry-run', action='store_true', help='Only print the planned moves and deletions')
+    args = parser.parse_args()
+    reorganize_artifacts(dry_run=args.dry_run)
@@ -0,0 +1,222 @@
+import errno
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from src.constants_and_keywords_to_filter import AUDIO_STORE_DIRECTORY, AUDIO_STORE_INDEX_FILE_PATH
+
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+def _id3v2_size(header: bytes) -> int:
+    # Size of a leading ID3v2 tag: its 10 byte header, the syncsafe size of its body, and its optional footer
+    if len(header) < 10 or header[:3] != b'ID3':
+        return 0
+    body_size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+    return 10 + body_size + (10 if header[5] & 0x10 else 0)
+
+
+def audio_stream_hash(file_path: str) -> str:
+    """
+    Returns the BLAKE2b digest of an audio file's stream.
+
+    ID3 tags are left out of the hash, so an mp3 hashes the same whatever title its tags carry. Other containers
+    are hashed whole.
+
+    Args:
+        file_path (str): The audio file.
+
+    Returns:
+        str: The hexadecimal digest.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as file:
+        start = min(_id3v2_size(file.read(10)), size)
+        end = size
+        if end - start >= 128:
+            file.seek(end - 128)
+            if file.read(3) == b'TAG':
+                end -= 128
+        file.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = file.read(min(_HASH_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def _link(object_path: str, link_path: str) -> bool:
+    # A hard link when the store is on the same volume, a symbolic link otherwise. Returns True for a hard link
+    try:
+        os.link(object_path, link_path)
+        return True
+    except OSError:
+        os.symlink(os.path.abspath(object_path), link_path)
+        return False
+
+
+def _replace_with_link(object_path: str, file_path: str) -> bool:
+    # The link is made under a temporary name and renamed over the file, so a failure leaves the file in place
+    tmp_path = f"{file_path}.link.tmp"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    hard_link = _link(object_path, tmp_path)
+    try:
+        os.replace(tmp_path, file_path)
+    except OSError:
+        os.remove(tmp_path)
+        raise
+    return hard_link
+
+
+def _store_object(file_path: str, object_path: str) -> bool:
+    # Hard links the file into the store, or copies it there when the store is on another volume. Returns True if
+    # the file already is the stored object
+    os.makedirs(os.path.dirname(object_path), exist_ok=True)
+    try:
+        os.link(file_path, object_path)
+        return True
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    tmp_path = f"{object_path}.tmp"
+    shutil.copy2(file_path, tmp_path)
+    os.replace(tmp_path, object_path)
+    return False
+
+
+class AudioStore:
+    """
+    Content-addressed store of the downloaded audio.
+
+    Each distinct audio stream is stored once under its hash, and the per-title audio files of the dataset tree are
+    links to it, so that an episode downloaded twice or cross-posted by several channels takes the space of one file
+    and is recognized as a duplicate before it reaches diarization. Only byte-identical audio streams match: a
+    re-upload YouTube encoded separately practically never hashes the same, even if it sounds identical. The index is
+    an append-only JSON lines journal of {'hash', 'object', 'path', 'hard_link'} records, one per per-title link.
+    """
+
+    def __init__(self, store_directory: str = AUDIO_STORE_DIRECTORY, index_path: str = AUDIO_STORE_INDEX_FILE_PATH):
+        self.store_directory = store_directory
+        self.index_path = index_path
+        self._objects = {}  # hash -> object path
+        self._paths = {}  # hash -> per-title paths
+        self._hashes = {}  # per-title path -> hash
+        self._symlinked = set()  # Hashes with symbolic links, which cannot be counted and are never pruned
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, store_directory: str = AUDIO_STORE_DIRECTORY, index_path: str = AUDIO_STORE_INDEX_FILE_PATH) -> 'AudioStore':
+        store = cls(store_directory, index_path)
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn last line from an interrupted append, the file is hashed again when next seen
+                        continue
+                    store._remember(record['hash'], record['object'], record['path'], record.get('hard_link', True))
+        logging.info(f"Loaded audio store index with {len(store._objects)} distinct audio files from {index_path}")
+        return store
+
+    def _remember(self, digest: str, object_path: str, path: str, hard_link: bool = True):
+        self._objects[digest] = object_path
+        if not hard_link:
+            self._symlinked.add(digest)
+        paths = self._paths.setdefault(digest, [])
+        if path not in paths:
+            paths.append(path)
+        self._hashes[path] = digest
+
+    def paths(self, digest: str) -> List[str]:
+        """
+        Returns every per-title path recorded for an audio hash, including those that no longer exist.
+        """
+        return list(self._paths.get(digest, []))
+
+    def hash_of(self, file_path: str) -> str:
+        """
+        Returns the audio hash of a file, from the index if the file is one of the store's links.
+        """
+        digest = self._hashes.get(os.path.abspath(file_path))
+        if digest and os.path.exists(self._objects[digest]) and os.path.samefile(file_path, self._objects[digest]):
+            return digest
+        return audio_stream_hash(file_path)
+
+    def add(self, file_path: str) -> Tuple[str, Optional[str]]:
+        """
+        Links an audio file into the store, or copies it there if the store is on another volume, and makes the
+        file a link to the stored audio. If the same audio is already stored, the file is a duplicate and is replaced
+        with a link to it. The file is only replaced once the stored audio exists, so a failure leaves it in place.
+
+        Args:
+            file_path (str): A downloaded per-title audio file.
+
+        Returns:
+            Tuple[str, Optional[str]]: The audio hash, and an existing per-title file with the same audio, if any.
+        """
+        file_path = os.path.abspath(file_path)
+        digest = self.hash_of(file_path)
+        with self._lock:
+            object_path = self._objects.get(digest)
+            if object_path and os.path.exists(object_path) and os.path.samefile(file_path, object_path):
+                return digest, self._duplicate_of(digest, file_path)
+            duplicate_of = self._duplicate_of(digest, file_path)
+            if not (object_path and os.path.exists(object_path)):
+                object_path = os.path.join(self.store_directory, digest[:2], f"{digest}{os.path.splitext(file_path)[1]}")
+            # The per-title file is only replaced once the stored object exists
+            if not os.path.exists(object_path) and _store_object(file_path, object_path):
+                hard_link = True
+            else:
+                hard_link = _replace_with_link(object_path, file_path)
+            self._remember(digest, object_path, file_path, hard_link)
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            with open(self.index_path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps({'hash': digest, 'object': object_path, 'path': file_path, 'hard_link': hard_link}, ensure_ascii=False) + '\n')
+        return digest, duplicate_of
+
+    def _duplicate_of(self, digest: str, file_path: str) -> Optional[str]:
+        return next((path for path in self._paths.get(digest, []) if path != file_path and os.path.lexists(path)), None)
+
+    def group_by_content(self, file_paths: List[str]) -> Dict[str, List[str]]:
+        """
+        Groups audio files by their audio hash, adding the files that are not in the store yet.
+
+        Returns:
+            Dict[str, List[str]]: The files per hash, in the order of file_paths.
+        """
+        groups = {}
+        for file_path in file_paths:
+            try:
+                digest, _ = self.add(file_path)
+            except OSError as e:
+                logging.warning(f"Could not add {file_path} to the audio store: {e}")
+                digest = file_path  # Kept apart from every other file
+            groups.setdefault(digest, []).append(file_path)
+        return groups
+
+    def prune(self) -> int:
+        """
+        Deletes the stored audio no per-title file links to anymore, e.g. after the repair mode removed the audio of
+        transcribed videos. Only hard-linked audio is pruned, since its link count also covers renamed links. The
+        hashes stay in the index, so later copies are still recognized as duplicates.
+
+        Returns:
+            int: The number of deleted objects.
+        """
+        pruned = 0
+        with self._lock:
+            for digest, object_path in self._objects.items():
+                if digest not in self._symlinked and os.path.exists(object_path) and os.stat(object_path).st_nlink == 1:
+                    os.remove(object_path)
+                    pruned += 1
+        return pruned
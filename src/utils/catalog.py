@@ -0,0 +1,283 @@
+import csv
+import io
+import logging
+import os
+import re
+import threading
+from typing import List, Optional
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+
+_SPACES_REGEX = re.compile(r' +')
+_VIDEO_ID_IN_URL_REGEX = re.compile(r'(?:[?&]v=|youtu\.be/)([^&#?/]+)')
+
+# video_id is the primary key of the catalog, decision and rule_id record the filter rule that decided each video.
+# New columns are appended last so that existing column positions are unchanged.
+CATALOG_HEADERS = ['title', 'channel_name', 'published_date', 'url', 'video_id', 'decision', 'rule_id']
+
+
+def normalize_title(title) -> str:
+    """
+    Normalizes a title the way the catalog compares them: runs of spaces collapsed and surrounding whitespace stripped.
+    """
+    return _SPACES_REGEX.sub(' ', str(title)).strip()
+
+
+def channel_key(channel_name) -> str:
+    """
+    Normalizes a channel name for lookups, unwrapping the quotes that keep names starting with '=' out of formulas.
+    """
+    return str(channel_name or '').strip().strip('"').strip().lower()
+
+
+def row_video_id(row: dict) -> Optional[str]:
+    """
+    Returns the video ID of a catalog row or API result, backfilling it from the URL when the row does not carry one.
+    """
+    video_id = row.get('video_id') or row.get('id')
+    if isinstance(video_id, str) and video_id:
+        return video_id
+    return video_id_from_url(row.get('url'))
+
+
+def video_id_from_url(url) -> Optional[str]:
+    """
+    Extracts the video ID from a https://www.youtube.com/watch?v=<id> or https://youtu.be/<id> URL.
+    """
+    if not isinstance(url, str) or not url:
+        return None
+    parsed_url = urlparse(url)
+    if parsed_url.netloc.endswith('youtu.be'):
+        return parsed_url.path.lstrip('/') or None
+    video_ids = parse_qs(parsed_url.query).get('v')
+    return video_ids[0] if video_ids else None
+
+
+def video_ids_from_urls(urls: pd.Series) -> pd.Series:
+    """
+    Vectorized video_id_from_url over a column of URLs, with '' where no video ID is found.
+    """
+    return urls.astype(str).str.extract(_VIDEO_ID_IN_URL_REGEX, expand=False).fillna('')
+
+
+class VideoCatalog:
+    """
+    In-memory view of the videos catalog CSV, loaded once per run and shared across channels.
+
+    Rows are keyed by video ID, with secondary indexes on URL, normalized title and channel, so that membership checks
+    are dictionary lookups. Rows without a video_id column are backfilled from their URL when loaded.
+    The catalog is updated in place as new rows are accepted so that later batches see them without re-reading the CSV.
+    """
+
+    def __init__(self, rows: Optional[List[dict]] = None):
+        self.rows = []
+        self._by_title = {}
+        self._by_url = {}
+        self._by_video_id = {}
+        self._by_channel = {}
+        for row in rows or []:
+            self.add(row)
+
+    @classmethod
+    def load(cls, csv_file_path: str) -> 'VideoCatalog':
+        if not os.path.exists(csv_file_path):
+            return cls()
+        df = pd.read_csv(csv_file_path, encoding='utf-8', dtype=str, keep_default_na=False)
+        catalog = cls(df.to_dict('records'))
+        logging.info(f"Loaded {len(catalog.rows)} videos from {csv_file_path}")
+        return catalog
+
+    def add(self, row: dict):
+        """
+        Adds a row to the catalog and its lookup tables.
+        """
+        video_id = row_video_id(row)
+        if video_id:
+            row['video_id'] = video_id
+            self._by_video_id[video_id] = row
+        self.rows.append(row)
+        self._by_title[normalize_title(row.get('title', ''))] = row
+        url = row.get('url')
+        if url:
+            self._by_url[url] = row
+        self._by_channel.setdefault(channel_key(row.get('channel_name')), []).append(row)
+
+    def get_by_title(self, title) -> Optional[dict]:
+        return self._by_title.get(normalize_title(title))
+
+    def get_by_url(self, url) -> Optional[dict]:
+        return self._by_url.get(url)
+
+    def get_by_video_id(self, video_id) -> Optional[dict]:
+        return self._by_video_id.get(video_id)
+
+    def rows_for_channel(self, channel_name) -> List[dict]:
+        return self._by_channel.get(channel_key(channel_name), [])
+
+    def contains_title(self, title) -> bool:
+        return normalize_title(title) in self._by_title
+
+    def contains_url(self, url) -> bool:
+        return url in self._by_url
+
+    def contains_video_id(self, video_id) -> bool:
+        return video_id in self._by_video_id
+
+    def contains(self, row: dict) -> bool:
+        """
+        Returns True if the row's video is already in the catalog, falling back to the title for rows without an ID.
+        """
+        video_id = row_video_id(row)
+        if video_id:
+            return video_id in self._by_video_id
+        return self.contains_title(row.get('title', ''))
+
+    def channel_names(self) -> set:
+        return {str(row.get('channel_name', '')).strip() for row in self.rows}
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def migrate_catalog_schema(csv_file_path: str) -> bool:
+    """
+    One-shot migration of a catalog CSV written by an earlier version: adds the missing CATALOG_HEADERS columns,
+    backfilling video_id from the url column. Missing decisions are left empty and evaluated by the next filtering.
+
+    Returns:
+        bool: True if the file was migrated, False if it already had every column.
+    """
+    df = pd.read_csv(csv_file_path, encoding='utf-8', dtype=str, keep_default_na=False)
+    missing_headers = [header for header in CATALOG_HEADERS if header not in df.columns]
+    if not missing_headers:
+        return False
+    for header in missing_headers:
+        df[header] = video_ids_from_urls(df['url']) if header == 'video_id' else ''
+    write_csv_atomically(df[[header for header in CATALOG_HEADERS if header in df.columns]], csv_file_path)
+    logging.info(f"Migrated {csv_file_path}, added the columns {missing_headers}, {int((df['video_id'] == '').sum())} rows without a video ID")
+    return True
+
+
+def write_csv_atomically(df: pd.DataFrame, csv_file_path: str):
+    """
+    Writes a DataFrame to a temporary file next to csv_file_path and renames it into place, so that a crash
+    mid-write never leaves a truncated CSV behind.
+    """
+    tmp_path = f"{csv_file_path}.tmp"
+    df.to_csv(tmp_path, index=False, quoting=csv.QUOTE_MINIMAL, encoding='utf-8')
+    with open(tmp_path, 'rb+') as file:
+        os.fsync(file.fileno())
+    os.replace(tmp_path, csv_file_path)
+
+
+class CatalogWriter:
+    """
+    Append-only writer for the videos catalog CSV.
+
+    Rows are deduplicated by video ID against the shared VideoCatalog, buffered and appended in batches of flush_every rows,
+    so a run never rewrites the rows that are already on disk. All methods are guarded by a lock, which makes the
+    writer safe to share between the channel and playlist fetch paths, including from worker threads.
+    """
+
+    def __init__(self, csv_file_path: str, catalog: VideoCatalog, headers: List[str], flush_every: int = 500):
+        self.csv_file_path = csv_file_path
+        self.catalog = catalog
+        self.headers = headers
+        self.flush_every = flush_every
+        self._pending = []
+        self._lock = threading.Lock()
+        self._tail_checked = False
+
+    def add_rows(self, video_info_list: List[dict]) -> int:
+        """
+        Queues the rows that are not in the catalog yet, flushing once enough rows are pending.
+
+        Returns:
+            int: The number of new rows accepted.
+        """
+        with self._lock:
+            accepted = 0
+            for video_info in video_info_list:
+                if self.catalog.contains(video_info):
+                    continue
+                row = {header: video_info.get(header) for header in self.headers}
+                row['video_id'] = row_video_id(video_info)
+                self.catalog.add(row)
+                self._pending.append(row)
+                accepted += 1
+            if len(self._pending) >= self.flush_every:
+                self._flush()
+            return accepted
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        if not self._tail_checked:
+            self._drop_torn_tail()
+            self._tail_checked = True
+        write_header = not os.path.exists(self.csv_file_path) or os.path.getsize(self.csv_file_path) == 0
+        with open(self.csv_file_path, 'a', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=self.headers, quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+            if write_header:
+                writer.writeheader()
+            writer.writerows(self._pending)
+            file.flush()
+            os.fsync(file.fileno())
+        logging.info(f"Appended {len(self._pending)} videos to {self.csv_file_path}")
+        self._pending = []
+
+    def _drop_torn_tail(self):
+        # A crash during a previous append can leave a partial last row, cut it off before appending after it. A
+        # complete last row that only lacks its newline, e.g. in a hand-edited or exported file, is kept
+        if not os.path.exists(self.csv_file_path) or os.path.getsize(self.csv_file_path) == 0:
+            return
+        with open(self.csv_file_path, 'rb+') as file:
+            file.seek(-1, os.SEEK_END)
+            if file.read(1) == b'\n':
+                return
+            file.seek(0)
+            content = file.read()
+            # Titles may contain quoted newlines, so the start of the last row is found by parsing the rows
+            reader = csv.reader(io.StringIO(content.decode('utf-8', errors='replace'), newline=''), strict=True)
+            last_row_line, last_row = 0, None
+            while True:
+                row_line = reader.line_num
+                try:
+                    row = next(reader)
+                except StopIteration:
+                    break
+                except csv.Error:
+                    row = None
+                last_row_line, last_row = row_line, row
+                if row is None:
+                    break
+            if last_row is not None and len(last_row) == len(self.headers):
+                file.write(b'\n')
+                logging.info(f"Added the missing newline after the last row of {self.csv_file_path}")
+                return
+            # Only a torn header line, the first line, truncates the file to zero bytes, it is written again in full
+            offset = 0
+            for _ in range(last_row_line):
+                offset = content.index(b'\n', offset) + 1
+            file.truncate(offset)
+            logging.warning(f"Dropped a partially written last row from {self.csv_file_path}")
+
+    def compact(self):
+        """
+        Flushes pending rows and rewrites the whole catalog from memory with an atomic temp-file-plus-rename.
+        """
+        with self._lock:
+            self._pending = []
+            write_csv_atomically(pd.DataFrame(self.catalog.rows, columns=self.headers), self.csv_file_path)
+            self._tail_checked = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
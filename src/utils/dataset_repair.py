@@ -0,0 +1,120 @@
+import logging
+import os
+from typing import List
+
+from src.utils.fs_operations import ACTION_DELETE, ACTION_RENAME, ACTION_RMDIR, ACTION_RMTREE, FsOperation, FsOperationJournal
+from src.utils.utils import fullwidth_to_ascii
+
+
+def _standardize_name(dir_or_file_name: str) -> str:
+    # Replaces the full-width colon yt-dlp writes with the ASCII one
+    return dir_or_file_name.replace('：', ':')
+
+
+def plan_merge_directories(base_path: str) -> List[FsOperation]:
+    """
+    Plans the merge of directories whose names differ only by the full-width colon into their ASCII-named directory,
+    in a single walk of the tree.
+
+    A full-width directory without an ASCII counterpart is renamed. Otherwise its files are moved into the ASCII
+    directory, those that already exist there are deleted, and the emptied directory is removed. Merged directories
+    are not descended into, their contents are part of the merge.
+
+    Args:
+        base_path (str): The base directory path to start searching from.
+
+    Returns:
+        List[FsOperation]: The operations, in an order in which they can be applied.
+    """
+    operations, claimed = [], set()
+    for root, dirs, _ in os.walk(base_path):
+        merged = set()
+        for dir_name in dirs:
+            src = os.path.join(root, dir_name)
+            dst = os.path.join(root, _standardize_name(dir_name))
+            if src == dst:
+                continue
+            merged.add(dir_name)
+            if not os.path.exists(dst) and dst not in claimed:
+                operations.append(FsOperation(ACTION_RENAME, src, dst))
+                claimed.add(dst)
+                continue
+            with os.scandir(src) as entries:
+                for entry in entries:
+                    dst_item = os.path.join(dst, _standardize_name(entry.name))
+                    if not os.path.exists(dst_item) and dst_item not in claimed:
+                        operations.append(FsOperation(ACTION_RENAME, entry.path, dst_item))
+                        claimed.add(dst_item)
+                    elif entry.is_dir(follow_symlinks=False):
+                        logging.warning(f"Not merging directory {entry.path} into the existing {dst_item}")
+                    else:
+                        # If there is a conflict, delete the source item
+                        operations.append(FsOperation(ACTION_DELETE, entry.path))
+            operations.append(FsOperation(ACTION_RMDIR, src))
+        dirs[:] = [dir_name for dir_name in dirs if dir_name not in merged]
+    return operations
+
+
+def plan_clean_fullwidth_characters(base_path: str) -> List[FsOperation]:
+    """
+    Plans renaming the files and directories with full-width characters in their name to their ASCII name, in a
+    single bottom-up walk of the tree. If the ASCII name is already taken, the full-width file or directory is
+    deleted instead, and nothing within a deleted directory is renamed beforehand.
+
+    Args:
+        base_path (str): The base directory path to start searching from.
+
+    Returns:
+        List[FsOperation]: The operations, in an order in which they can be applied.
+    """
+    operations, claimed, deleted_dirs = [], set(), set()
+    for root, dirs, files in os.walk(base_path, topdown=False):  # topdown=False to start from the innermost directories
+        for name, is_dir in [(file, False) for file in files] + [(dir_name, True) for dir_name in dirs]:
+            new_name = ''.join(fullwidth_to_ascii(char) for char in name)
+            if new_name == name:
+                continue
+            original_path = os.path.join(root, name)
+            new_path = os.path.join(root, new_name)
+            if os.path.exists(new_path) or new_path in claimed:
+                # If the ASCII version exists, delete the full-width version, with all its contents for a directory
+                operations.append(FsOperation(ACTION_RMTREE if is_dir else ACTION_DELETE, original_path))
+                if is_dir:
+                    deleted_dirs.add(original_path)
+            else:
+                operations.append(FsOperation(ACTION_RENAME, original_path, new_path))
+                claimed.add(new_path)
+
+    def within_deleted_dir(path: str) -> bool:
+        parent = os.path.dirname(path)
+        while parent and parent != path:
+            if parent in deleted_dirs:
+                return True
+            path, parent = parent, os.path.dirname(parent)
+        return False
+
+    return [operation for operation in operations if not within_deleted_dir(operation.source)]
+
+
+def merge_directories(base_path: str):
+    """
+    Merges the directories whose names differ only by the full-width colon into their ASCII-named directory, see
+    plan_merge_directories. The operations are journaled and run in parallel, an interrupted merge is rolled forward
+    on the next call.
+    """
+    journal = FsOperationJournal('merge_directories')
+    journal.roll_forward()
+    operations = plan_merge_directories(base_path)
+    applied = journal.run(operations)
+    logging.info(f"Merged directories under {base_path}: {applied} of {len(operations)} operations applied")
+
+
+def clean_fullwidth_characters(base_path: str):
+    """
+    Renames files and directories to their ASCII name, see plan_clean_fullwidth_characters. The operations are
+    journaled and run in parallel, an interrupted run is rolled forward on the next call.
+    """
+    journal = FsOperationJournal('clean_fullwidth_characters')
+    journal.roll_forward()
+    operations = plan_clean_fullwidth_characters(base_path)
+    applied = journal.run(operations)
+    logging.info(f"Cleaned full-width characters under {base_path}: {applied} of {len(operations)} operations applied")
@@ -1,29 +1,77 @@
+import json
 import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
 
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
 
+from src.utils.sync_state import ChannelSyncState, split_new_playlist_items, newest_playlist_item
+from src.utils.quota import execute_request
+from src.constants_and_keywords_to_filter import MAPPING_FILE_PATH
 
-def get_videos_from_playlist(credentials: Credentials, api_key: str, playlist_id: str, max_results: int = 5000) -> List[dict]:
-    # Initialize the YouTube API client
-    if credentials is None:
-        youtube = build('youtube', 'v3', developerKey=api_key)
-    else:
-        youtube = build('youtube', 'v3', credentials=credentials, developerKey=api_key)
 
+# Channel IDs are 'UC' followed by 22 URL-safe base64 characters, channel names may start with 'UC' as well
+_CHANNEL_ID_REGEX = re.compile(r'^UC[0-9A-Za-z_-]{22}$')
+
+_discovery_document = None
+_discovery_document_lock = threading.Lock()
+_thread_local_clients = threading.local()
+
+
+def _youtube_discovery_document() -> dict:
+    # Parsed once per process from the discovery document bundled with googleapiclient
+    global _discovery_document
+    with _discovery_document_lock:
+        if _discovery_document is None:
+            _discovery_document = json.loads(discovery_cache.get_static_doc('youtube', 'v3'))
+        return _discovery_document
+
+
+def youtube_client(credentials: Optional[Credentials], api_key: str):
+    """
+    Returns a YouTube API client for the given credentials and API key, building it only on first use.
+
+    googleapiclient clients and their httplib2 transport are not thread-safe, so clients are cached per thread.
+    Reusing a client reuses its HTTP connections, which avoids a TLS handshake per call.
+
+    Args:
+        credentials (Optional[Credentials]): Service account credentials, or None for API key access only.
+        api_key (str): The API key chosen by the quota scheduler.
+
+    Returns:
+        googleapiclient.discovery.Resource: The YouTube Data API v3 client.
+    """
+    clients = getattr(_thread_local_clients, 'clients', None)
+    if clients is None:
+        clients = _thread_local_clients.clients = {}
+    cache_key = (id(credentials), api_key)
+    if cache_key not in clients:
+        if credentials is None:
+            youtube = build_from_document(_youtube_discovery_document(), developerKey=api_key)
+        else:
+            youtube = build_from_document(_youtube_discovery_document(), credentials=credentials, developerKey=api_key)
+        # Keep a reference to the credentials so that their id() cannot be reused by another object
+        clients[cache_key] = (credentials, youtube)
+    return clients[cache_key][1]
+
+
+def get_videos_from_playlist(credentials: Credentials, api_key: str, playlist_id: str, max_results: int = 5000) -> List[dict]:
     video_info = []
     next_page_token = None
 
     while True:
-        playlist_request = youtube.playlistItems().list(
+        playlist_response = execute_request('playlistItems.list', lambda key: youtube_client(credentials, key).playlistItems().list(
             part="snippet",
             playlistId=playlist_id,
             maxResults=max_results,
             pageToken=next_page_token,
             fields="nextPageToken,items(snippet(publishedAt,resourceId(videoId),title))"
-        )
-        playlist_response = playlist_request.execute()
+        ), api_key)
         items = playlist_response.get('items', [])
 
         for item in items:
@@ -43,22 +91,110 @@ def get_videos_from_playlist(credentials: Credentials, api_key: str, playlist_id
     return video_info
 
 
-async def get_channel_id(session, api_key, channel_name, channel_name_to_id):
-    if channel_name in channel_name_to_id:
-        return channel_name_to_id[channel_name]
+def load_channel_mapping(mapping_file_path: str = MAPPING_FILE_PATH) -> dict:
+    """
+    Loads the persistent channel handle mapping: {handle: {'channel_id', 'channel_name', 'uploads_playlist_id'}}.
+
+    Mappings written by earlier versions stored either the channel name or the channel ID as a plain string,
+    those entries are kept as partial entries and completed on the next resolution.
+    """
+    if not os.path.exists(mapping_file_path):
+        return {}
+    with open(mapping_file_path, 'r', encoding='utf-8') as file:
+        mapping = json.load(file)
+    for channel_handle, value in mapping.items():
+        if isinstance(value, str):
+            mapping[channel_handle] = {'channel_id': value} if _CHANNEL_ID_REGEX.match(value) else {'channel_name': value}
+    return mapping
+
+
+def save_channel_mapping(mapping: dict, mapping_file_path: str = MAPPING_FILE_PATH):
+    tmp_path = f"{mapping_file_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(mapping, file, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, mapping_file_path)
+
+
+def _channel_entry(item: dict) -> dict:
+    channel_name = item['snippet']['title']
+    # Check if the channel name starts with "=" and wrap it in triple quotes if so, to keep it out of spreadsheet formulas
+    if channel_name.startswith("="):
+        channel_name = f'"""{channel_name}"""'
+    return {
+        'channel_id': item['id'],
+        'channel_name': channel_name,
+        'uploads_playlist_id': item['contentDetails']['relatedPlaylists']['uploads'],
+    }
+
+
+def _is_complete(entry: Optional[dict]) -> bool:
+    return bool(entry) and all(entry.get(field) for field in ('channel_id', 'channel_name', 'uploads_playlist_id'))
+
+
+def resolve_channel_handles(credentials: Optional[Credentials], api_key: str, channel_handles: List[str],
+                            mapping_file_path: str = MAPPING_FILE_PATH, max_workers: int = 8) -> dict:
+    """
+    Resolves channel handles to their channel ID, title and uploads playlist ID with channels.list (1 unit per call)
+    instead of a fuzzy search.list (100 units per call), caching the result in the persistent mapping.
+
+    channels.list only accepts a single forHandle per request, so unknown handles are resolved concurrently, one
+    request each. Entries whose channel ID is already known are completed 50 at a time with the id parameter.
+
+    Args:
+        credentials (Optional[Credentials]): Service account credentials, or None.
+        api_key (str): Your YouTube Data API key.
+        channel_handles (List[str]): Channel handles, e.g. '@flashbots'.
+        mapping_file_path (str): Path of the persistent mapping.
+        max_workers (int): Number of forHandle requests in flight.
 
-    url = f"https://www.googleapis.com/youtube/v3/search?part=snippet&type=channel&maxResults=1&q={channel_name}&key={api_key}"
-    async with session.get(url) as response:
-        if response.status == 200:
-            data = await response.json()
-            items = data.get('items', [])
-            if items:
-                channel_id = items[0]['id']['channelId']
-                channel_name_to_id[channel_name] = channel_id  # Update the mapping
-                logging.info(f"Found channel ID for {channel_name}: {channel_id}")
-                return channel_id
-        logging.warning(f"Channel ID not found for {channel_name}")
-        return None  # Handle errors or missing data as appropriate for your application
+    Returns:
+        dict: {handle: {'channel_id', 'channel_name', 'uploads_playlist_id'}} for every handle that was resolved.
+    """
+    channel_handles = [channel_handle.strip() for channel_handle in channel_handles if channel_handle.strip()]
+    mapping = load_channel_mapping(mapping_file_path)
+    incomplete_handles = [channel_handle for channel_handle in dict.fromkeys(channel_handles) if not _is_complete(mapping.get(channel_handle))]
+
+    # Handles whose channel ID is known are completed in batches of 50 IDs per request
+    handles_by_id = {mapping[channel_handle]['channel_id']: channel_handle for channel_handle in incomplete_handles
+                     if mapping.get(channel_handle, {}).get('channel_id')}
+    channel_ids = list(handles_by_id)
+    for i in range(0, len(channel_ids), 50):
+        id_batch = channel_ids[i:i + 50]
+        response = execute_request('channels.list', lambda key: youtube_client(credentials, key).channels().list(
+            part='snippet,contentDetails',
+            id=','.join(id_batch),
+            maxResults=50,
+            fields='items(id,snippet/title,contentDetails/relatedPlaylists/uploads)'
+        ), api_key)
+        for item in response.get('items', []):
+            mapping[handles_by_id[item['id']]] = _channel_entry(item)
+
+    def resolve_handle(channel_handle):
+        try:
+            response = execute_request('channels.list', lambda key: youtube_client(credentials, key).channels().list(
+                part='snippet,contentDetails',
+                forHandle=channel_handle,
+                fields='items(id,snippet/title,contentDetails/relatedPlaylists/uploads)'
+            ), api_key)
+        except Exception as e:
+            logging.error(f"[{channel_handle}] Error resolving channel handle: {e}")
+            return channel_handle, None
+        items = response.get('items', [])
+        return channel_handle, _channel_entry(items[0]) if items else None
+
+    unknown_handles = [channel_handle for channel_handle in incomplete_handles if not _is_complete(mapping.get(channel_handle))]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for channel_handle, entry in executor.map(resolve_handle, unknown_handles):
+            if entry:
+                mapping[channel_handle] = entry
+                logging.info(f"[{channel_handle}] resolved to {entry['channel_name']} ({entry['channel_id']})")
+            else:
+                logging.warning(f"Channel not found for handle {channel_handle}")
+
+    if incomplete_handles:
+        save_channel_mapping(mapping, mapping_file_path)
+
+    return {channel_handle: mapping[channel_handle] for channel_handle in channel_handles if _is_complete(mapping.get(channel_handle))}
 
 
 def get_playlist_title(credentials: Credentials, api_key: str, playlist_id: str) -> Optional[str]:
@@ -72,19 +208,12 @@ def get_playlist_title(credentials: Credentials, api_key: str, playlist_id: str)
     Returns:
         Optional[str]: The title of the playlist if found, otherwise None.
     """
-    # Initialize the YouTube API client
-    if credentials is None:
-        youtube = build('youtube', 'v3', developerKey=api_key)
-    else:
-        youtube = build('youtube', 'v3', credentials=credentials, developerKey=api_key)
-
-    request = youtube.playlists().list(
+    response = execute_request('playlists.list', lambda key: youtube_client(credentials, key).playlists().list(
         part='snippet',
         id=playlist_id,
         fields='items(snippet/title)',
         maxResults=1
-    )
-    response = request.execute()
+    ), api_key)
     items = response.get('items', [])
 
     if items:
@@ -93,7 +222,8 @@ def get_playlist_title(credentials: Credentials, api_key: str, playlist_id: str)
         return None
 
 
-def get_video_info(credentials: Credentials, api_key: str, channel_id: str, max_results: int = 500000) -> List[dict]:
+def get_video_info(credentials: Credentials, api_key: str, channel_id: str, max_results: int = 500000, sync_state: Optional[ChannelSyncState] = None,
+                   uploads_playlist_id: Optional[str] = None) -> List[dict]:
     """
     Retrieves video information (URL, ID, and title) from a YouTube channel using the YouTube Data API.
 
@@ -101,43 +231,43 @@ def get_video_info(credentials: Credentials, api_key: str, channel_id: str, max_
         api_key (str): Your YouTube Data API key.
         channel_id (str): The YouTube channel ID.
         max_results (int, optional): Maximum number of results to retrieve. Defaults to 50.
+        sync_state (Optional[ChannelSyncState]): If provided, paging stops at the channel's high-water mark and the
+            newest listed upload is staged as the new mark.
+        uploads_playlist_id (Optional[str]): The channel's "Uploads" playlist ID if already known from the channel mapping.
 
     Returns:
         list: A list of dictionaries containing video URL, ID, and title from the channel.
     """
-    # Initialize the YouTube API client
-    if credentials is None:
-        youtube = build('youtube', 'v3', developerKey=api_key)
-    else:
-        youtube = build('youtube', 'v3', credentials=credentials, developerKey=api_key)
-
     # Get the "Uploads" playlist ID
-    channel_request = youtube.channels().list(
-        part="contentDetails",
-        id=channel_id,
-        fields="items/contentDetails/relatedPlaylists/uploads"
-    )
-    channel_response = channel_request.execute()
-    uploads_playlist_id = channel_response["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
+    if not uploads_playlist_id:
+        channel_response = execute_request('channels.list', lambda key: youtube_client(credentials, key).channels().list(
+            part="contentDetails",
+            id=channel_id,
+            fields="items/contentDetails/relatedPlaylists/uploads"
+        ), api_key)
+        uploads_playlist_id = channel_response["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
 
     # Fetch videos from the "Uploads" playlist
     video_info = []
+    new_items = []
     next_page_token = None
+    high_water_mark = sync_state.high_water_mark(channel_id) if sync_state else None
 
     while True:
-        playlist_request = youtube.playlistItems().list(
-            part="snippet",
-            playlistId=uploads_playlist_id,
-            maxResults=max_results,
-            pageToken=next_page_token,
-            fields="nextPageToken,items(snippet(publishedAt,resourceId(videoId),title))"
-        )
         try:
-            playlist_response = playlist_request.execute()
+            playlist_response = execute_request('playlistItems.list', lambda key: youtube_client(credentials, key).playlistItems().list(
+                part="snippet",
+                playlistId=uploads_playlist_id,
+                maxResults=max_results,
+                pageToken=next_page_token,
+                fields="nextPageToken,items(snippet(publishedAt,resourceId(videoId),title))"
+            ), api_key)
         except Exception as e:
-            print(f"Error fetching videos for channel {channel_id}: {e}")
+            logging.error(f"Error fetching videos for channel {channel_id}: {e}")
+            # Keep the previous high-water mark, the unseen pages must be listed again on the next run
             return video_info
-        items = playlist_response.get('items', [])
+        items, reached_known_item = split_new_playlist_items(playlist_response.get('items', []), high_water_mark)
+        new_items.extend(items)
 
         for item in items:
             video_id = item["snippet"]["resourceId"]["videoId"]
@@ -150,25 +280,9 @@ def get_video_info(credentials: Credentials, api_key: str, channel_id: str, max_
 
         next_page_token = playlist_response.get("nextPageToken")
 
-        if next_page_token is None or len(video_info) >= max_results:
+        if next_page_token is None or len(video_info) >= max_results or reached_known_item:
             break
-    return video_info
-
-
-def get_channel_name(api_key, channel_handle):
-    youtube = build('youtube', 'v3', developerKey=api_key)
-
-    request = youtube.search().list(
-        part='snippet',
-        type='channel',
-        q=channel_handle,
-        maxResults=1,
-        fields='items(snippet(channelTitle))'
-    )
-    response = request.execute()
-
-    if response['items']:
-        return response['items'][0]['snippet']['channelTitle']
-    else:
-        return None
 
+    if sync_state:
+        sync_state.stage(channel_id, newest_playlist_item(new_items))
+    return video_info
@@ -0,0 +1,137 @@
+import collections
+import logging
+import os
+import random
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from yt_dlp.utils import PostProcessingError
+
+ERROR_THROTTLED = 'throttled'
+ERROR_UNAVAILABLE = 'unavailable'  # Geo-blocked, private, members-only or age-restricted
+ERROR_REMOVED = 'removed'
+ERROR_NETWORK = 'network'
+ERROR_POSTPROCESSING = 'postprocessing'
+ERROR_UNKNOWN = 'unknown'
+
+# Failures that no retry will fix, recorded in the download ledger so that the video is never attempted again
+PERMANENT_ERRORS = {ERROR_UNAVAILABLE, ERROR_REMOVED}
+
+# Message fragments of each category, lowercase, checked in this order: YouTube words some throttling responses
+# as "Video unavailable. This content isn't available, try again later", so throttling comes before removal
+_ERROR_PATTERNS = [
+    (ERROR_THROTTLED, ('http error 429', 'too many requests', 'rate limit', 'rate-limit', 'not a bot', 'try again later')),
+    (ERROR_UNAVAILABLE, ('not available in your country', 'geo restrict', 'geo-restrict', 'private video', 'members-only', 'join this channel',
+                         'confirm your age', 'age-restricted')),
+    (ERROR_REMOVED, ('video unavailable', 'has been removed', 'has been terminated', 'no longer available', 'copyright', 'does not exist')),
+    (ERROR_POSTPROCESSING, ('ffmpeg', 'ffprobe', 'postprocessing', 'conversion failed')),
+    (ERROR_NETWORK, ('timed out', 'timeout', 'connection', 'http error 5', 'http error 403', 'unable to download', 'incomplete', 'temporary failure',
+                     'network', 'ssl', 'eof occurred')),
+]
+
+
+class RetryPolicy(NamedTuple):
+    retries: int  # Attempts after the first one within a run
+    base_delay: float  # Seconds, doubled for every further attempt
+    max_delay: float
+
+
+RETRY_POLICIES = {
+    ERROR_THROTTLED: RetryPolicy(3, 30, 600),
+    ERROR_NETWORK: RetryPolicy(4, 2, 60),
+    ERROR_POSTPROCESSING: RetryPolicy(1, 1, 5),
+    ERROR_UNKNOWN: RetryPolicy(2, 5, 60),
+    ERROR_UNAVAILABLE: RetryPolicy(0, 0, 0),
+    ERROR_REMOVED: RetryPolicy(0, 0, 0),
+}
+
+
+class DownloadFailed(Exception):
+    """
+    Raised once a download gave up, with the category of its last error.
+    """
+
+    def __init__(self, category: str, message: str):
+        super().__init__(f"{category}: {message}")
+        self.category = category
+        self.message = message
+
+    @property
+    def permanent(self) -> bool:
+        return self.category in PERMANENT_ERRORS
+
+
+def classify_download_error(error: Exception) -> str:
+    """
+    Returns the category of an exception raised by yt-dlp, from the exception it wraps and from its message.
+    """
+    cause = getattr(error, 'exc_info', None) and error.exc_info[1]
+    if isinstance(error, PostProcessingError) or isinstance(cause, PostProcessingError):
+        return ERROR_POSTPROCESSING
+    message = str(error).lower()
+    for category, fragments in _ERROR_PATTERNS:
+        if any(fragment in message for fragment in fragments):
+            return category
+    if isinstance(cause or error, (OSError, TimeoutError)):
+        return ERROR_NETWORK
+    return ERROR_UNKNOWN
+
+
+def backoff_delay(attempt: int, policy: RetryPolicy) -> float:
+    """
+    Returns the delay before retry number attempt (0 for the first retry): exponential in the attempt, with full
+    jitter so that workers that failed together do not retry together.
+    """
+    return random.uniform(0, min(policy.max_delay, policy.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Slows down the whole download pool when YouTube throttles it.
+
+    Workers record the outcome of every attempt. Once at least threshold of the last window attempts were
+    throttled, the breaker opens: every worker waits before its next attempt, for cooldown seconds, doubled each
+    time the breaker opens again before an attempt succeeded, up to max_cooldown.
+    """
+
+    def __init__(self, window: int = int(os.environ.get('CIRCUIT_BREAKER_WINDOW', 20)),
+                 threshold: float = float(os.environ.get('CIRCUIT_BREAKER_THROTTLE_RATE', 0.3)),
+                 cooldown: float = float(os.environ.get('CIRCUIT_BREAKER_COOLDOWN_SECONDS', 60)),
+                 max_cooldown: float = float(os.environ.get('CIRCUIT_BREAKER_MAX_COOLDOWN_SECONDS', 900))):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._min_samples = max(3, window // 4)
+        self._throttled = collections.deque(maxlen=window)
+        self._open_until = 0.0
+        self._trips = 0
+        self._lock = threading.Lock()
+
+    def record(self, category: Optional[str]):
+        """
+        Records the outcome of an attempt, None for a success.
+        """
+        with self._lock:
+            self._throttled.append(category == ERROR_THROTTLED)
+            if category is None and not any(self._throttled):
+                self._trips = 0
+            throttle_rate = sum(self._throttled) / len(self._throttled)
+            if len(self._throttled) >= self._min_samples and throttle_rate >= self.threshold and time.time() >= self._open_until:
+                cooldown = min(self.cooldown * 2 ** self._trips, self.max_cooldown)
+                self._trips += 1
+                self._open_until = time.time() + cooldown
+                self._throttled.clear()
+                logging.warning(f"{throttle_rate:.0%} of the recent downloads were throttled, pausing downloads for {cooldown:.0f}s")
+
+    def wait(self):
+        """
+        Blocks the calling worker while the breaker is open.
+        """
+        while True:
+            with self._lock:
+                remaining = self._open_until - time.time()
+            if remaining <= 0:
+                return
+            # Workers resume spread over a second rather than all at once
+            time.sleep(remaining + random.uniform(0, 1))
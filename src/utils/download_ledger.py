@@ -0,0 +1,158 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Iterable, List, Optional
+
+from src.constants_and_keywords_to_filter import DOWNLOAD_LEDGER_FILE_PATH
+
+JOB_QUEUED = 'queued'
+JOB_DOWNLOADING = 'downloading'
+JOB_DOWNLOADED = 'downloaded'
+JOB_FAILED = 'failed'
+JOB_SKIPPED = 'skipped'
+
+# Jobs that still have to be downloaded, 'downloading' ones were interrupted by the end of their run
+PENDING_JOB_STATES = {JOB_QUEUED, JOB_DOWNLOADING, JOB_FAILED}
+
+
+class DownloadLedger:
+    """
+    Persistent record of every download job, one job per video ID, with its state, failed attempts, bytes and timings.
+
+    The ledger is an append-only JSON lines journal where the last line of a video wins, written on each state
+    change. A run that crashes or is interrupted leaves its in-flight jobs as queued or downloading, so the next run
+    picks them up from the ledger, and yt-dlp resumes their .part files. Failed jobs are retried on later runs with
+    an exponential backoff: the n-th failure postpones the job by retry_base * 2 ** (n - 1) seconds, up to retry_max.
+    A job skipped under a condition, e.g. the filter rule version or the duration limit in force, is due again once
+    that condition is no longer among skip_conditions.
+    """
+
+    def __init__(self, ledger_file_path: str = DOWNLOAD_LEDGER_FILE_PATH,
+                 retry_base: float = float(os.environ.get('DOWNLOAD_RETRY_BASE_SECONDS', 600)),
+                 retry_max: float = float(os.environ.get('DOWNLOAD_RETRY_MAX_SECONDS', 7 * 24 * 3600)),
+                 skip_conditions: Iterable[str] = ()):
+        self.ledger_file_path = ledger_file_path
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.skip_conditions = set(skip_conditions)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, ledger_file_path: str = DOWNLOAD_LEDGER_FILE_PATH, **kwargs) -> 'DownloadLedger':
+        ledger = cls(ledger_file_path, **kwargs)
+        lines = 0
+        if os.path.exists(ledger_file_path):
+            with open(ledger_file_path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    lines += 1
+                    try:
+                        job = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn last line from an interrupted append, the previous state of the job still applies
+                        continue
+                    ledger._jobs[job['video_id']] = job
+        if lines > 2 * len(ledger._jobs) + 100:
+            ledger.compact()
+        interrupted = sum(job['state'] == JOB_DOWNLOADING for job in ledger._jobs.values())
+        logging.info(f"Loaded {len(ledger._jobs)} download jobs from {ledger_file_path}, {interrupted} were interrupted")
+        return ledger
+
+    def compact(self):
+        """
+        Rewrites the journal with the latest line of each job, atomically replacing the previous file.
+        """
+        os.makedirs(os.path.dirname(self.ledger_file_path), exist_ok=True)
+        tmp_path = f"{self.ledger_file_path}.tmp"
+        with self._lock:
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                for job in self._jobs.values():
+                    file.write(json.dumps(job, ensure_ascii=False) + '\n')
+            os.replace(tmp_path, self.ledger_file_path)
+
+    def _update(self, video_id: str, **fields) -> dict:
+        with self._lock:
+            job = {**self._jobs.get(video_id, {'video_id': video_id, 'attempts': 0, 'bytes': 0}), **fields, 'updated_at': time.time()}
+            self._jobs[video_id] = job
+            os.makedirs(os.path.dirname(self.ledger_file_path), exist_ok=True)
+            with open(self.ledger_file_path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(job, ensure_ascii=False) + '\n')
+            return job
+
+    def get(self, video_id: str) -> Optional[dict]:
+        return self._jobs.get(video_id)
+
+    def queue(self, video_id: str, channel_name: str, url: str, title: str):
+        self._update(video_id, channel=channel_name, url=url, title=title, state=JOB_QUEUED, bytes=0, error=None, permanent=False)
+
+    def start(self, video_id: str):
+        self._update(video_id, state=JOB_DOWNLOADING, started_at=time.time())
+
+    def finish(self, video_id: str, file_path: str):
+        job = self._jobs.get(video_id, {})
+        seconds = time.time() - job['started_at'] if job.get('started_at') else None
+        self._update(video_id, state=JOB_DOWNLOADED, file_path=file_path, finished_at=time.time(), seconds=seconds, next_attempt_at=None, error=None)
+
+    def fail(self, video_id: str, error: str, permanent: bool = False):
+        """
+        Records a failed attempt and postpones the job's next attempt exponentially in the number of failures, or
+        for good if the failure is permanent, e.g. a removed or private video.
+        """
+        attempts = self._jobs.get(video_id, {}).get('attempts', 0) + 1
+        next_attempt_at = None if permanent else time.time() + min(self.retry_base * 2 ** (attempts - 1), self.retry_max)
+        self._update(video_id, state=JOB_FAILED, attempts=attempts, error=error, permanent=permanent, next_attempt_at=next_attempt_at)
+
+    def postpone(self, video_id: str, reason: str, delay: float):
+        """
+        Puts the job back in the queue without counting a failure, e.g. for a live stream whose recording is not
+        available yet.
+        """
+        self._update(video_id, state=JOB_QUEUED, error=reason, next_attempt_at=time.time() + delay)
+
+    def skip(self, video_id: str, reason: str, condition: Optional[str] = None):
+        """
+        Records that the video is not to be downloaded, for good, or as long as condition is one of skip_conditions,
+        e.g. 'max_duration=14400' for a video that is too long.
+        """
+        self._update(video_id, state=JOB_SKIPPED, error=reason, skip_condition=condition, next_attempt_at=None)
+
+    def progress_hook(self, video_id: str):
+        """
+        Returns a yt-dlp progress hook that records when the job starts fetching and the bytes it fetched.
+        """
+        def hook(status: dict):
+            job = self._jobs.get(video_id, {})
+            if status.get('status') == 'downloading' and job.get('state') != JOB_DOWNLOADING:
+                self.start(video_id)
+            elif status.get('status') == 'finished':
+                # A file is finished once per requested format, e.g. audio and video of a merged format
+                self._update(video_id, bytes=job.get('bytes', 0) + (status.get('total_bytes') or status.get('downloaded_bytes') or 0))
+        return hook
+
+    def is_due(self, video_id: str, now: Optional[float] = None) -> bool:
+        """
+        Returns False if the video is skipped or failed for good, if it is skipped under a condition still in force, or
+        if its backoff has not elapsed yet. Videos without a job and downloaded ones are due, whether the latter still
+        have to be downloaded is up to the artifact index.
+        """
+        job = self._jobs.get(video_id)
+        if job is None:
+            return True
+        if job['state'] == JOB_SKIPPED:
+            # Skips recorded before conditions existed were filter or duration decisions, they are looked at again once
+            return 'skip_condition' not in job or (job['skip_condition'] is not None and job['skip_condition'] not in self.skip_conditions)
+        if job.get('permanent'):
+            return False
+        return (job.get('next_attempt_at') or 0) <= (now or time.time())
+
+    def due_video_ids(self, channel_name: str) -> List[str]:
+        """
+        Returns the video IDs of the channel's pending jobs that are due, interrupted ones first, and of its skipped
+        jobs whose skip condition changed.
+        """
+        now = time.time()
+        jobs = [job for job in self._jobs.values()
+                if job.get('channel') == channel_name and (job['state'] in PENDING_JOB_STATES or job['state'] == JOB_SKIPPED) and self.is_due(job['video_id'], now)]
+        return [job['video_id'] for job in sorted(jobs, key=lambda job: job['state'] != JOB_DOWNLOADING)]
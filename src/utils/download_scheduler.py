@@ -0,0 +1,123 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+
+class DownloadProgress:
+    """
+    Live counters of the download scheduler, updated from the worker threads, and of the transcode stage fed by it.
+    """
+
+    FIELDS = ('queued', 'downloading', 'transcoding', 'completed', 'failed')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def move(self, from_state: Optional[str], to_state: Optional[str]):
+        with self._lock:
+            if from_state:
+                self._counts[from_state] -= 1
+            if to_state:
+                self._counts[to_state] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+    def __str__(self):
+        return ', '.join(f"{field}: {count}" for field, count in self.snapshot().items())
+
+
+class DownloadScheduler:
+    """
+    Global download queue shared by every channel of a run.
+
+    Jobs are served by priority (lower first) and, within a priority, round-robin across channels: the n-th job
+    submitted by a channel is only served after the (n-1)-th job of every other channel with pending work. At most
+    network_limit downloads run at the same time, transcoding happens afterwards in the TranscodePool, and submit()
+    blocks once a channel has max_pending_per_channel jobs waiting, which slows down the metadata stage feeding the
+    queue without letting a large channel take all of the room from the others.
+    """
+
+    def __init__(self, download: Callable[[str, dict], Optional[str]],
+                 network_limit: int = int(os.environ.get('DOWNLOAD_NETWORK_CONCURRENCY', 4)),
+                 max_pending_per_channel: int = int(os.environ.get('DOWNLOAD_MAX_PENDING_PER_CHANNEL', 20)),
+                 progress_interval: float = float(os.environ.get('DOWNLOAD_PROGRESS_INTERVAL', 30))):
+        self.download = download
+        self.network_limit = network_limit
+        self.max_pending_per_channel = max_pending_per_channel
+        self.progress_interval = progress_interval
+        self.progress = DownloadProgress()
+        self._executor = ThreadPoolExecutor(max_workers=network_limit, thread_name_prefix='download')
+        self._heap = []
+        self._sequence = itertools.count()
+        self._submitted_per_channel = {}
+        self._pending_per_channel = {}
+        self._condition = None
+        self._workers = []
+
+    async def __aenter__(self) -> 'DownloadScheduler':
+        self._condition = asyncio.Condition()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.network_limit)]
+        self._workers.append(asyncio.create_task(self._log_progress()))
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._executor.shutdown(wait=True)
+        logging.info(f"Download scheduler finished, {self.progress}")
+
+    async def submit(self, channel_name: str, url: str, ydl_opts: dict, priority: int = 0) -> asyncio.Future:
+        """
+        Queues a download, waiting while the queue is full.
+
+        Returns:
+            asyncio.Future: Resolves to the return value of the download, or to the exception it raised.
+        """
+        future = asyncio.get_running_loop().create_future()
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._pending_per_channel.get(channel_name, 0) < self.max_pending_per_channel)
+            channel_turn = self._submitted_per_channel.get(channel_name, 0)
+            self._submitted_per_channel[channel_name] = channel_turn + 1
+            self._pending_per_channel[channel_name] = self._pending_per_channel.get(channel_name, 0) + 1
+            heapq.heappush(self._heap, (priority, channel_turn, next(self._sequence), channel_name, url, ydl_opts, future))
+            self.progress.move(None, 'queued')
+            self._condition.notify_all()
+        return future
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(lambda: self._heap)
+                _, _, _, channel_name, url, ydl_opts, future = heapq.heappop(self._heap)
+                self._pending_per_channel[channel_name] -= 1
+                self._condition.notify_all()  # Wakes up the channel's submitter if it was waiting for room in the queue
+            try:
+                future.set_result(await loop.run_in_executor(self._executor, self._run, url, ydl_opts))
+            except Exception as e:
+                logging.error(f"Download of {url} failed: {e}")
+                future.set_exception(e)
+
+    def _run(self, url: str, ydl_opts: dict) -> Optional[str]:
+        # The download returns the path of the audio file, or None if it failed
+        audio_file_path = None
+        self.progress.move('queued', 'downloading')
+        try:
+            audio_file_path = self.download(url, ydl_opts)
+            return audio_file_path
+        finally:
+            self.progress.move('downloading', 'completed' if audio_file_path else 'failed')
+
+    async def _log_progress(self):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            logging.info(f"Download progress: {self.progress}")
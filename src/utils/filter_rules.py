@@ -0,0 +1,174 @@
+import hashlib
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.constants_and_keywords_to_filter import FILTER_RULES_FILE_PATH
+from src.utils.keyword_matcher import get_keyword_matcher
+
+DECISION_KEEP = 'keep'
+DECISION_REMOVE = 'remove'
+DECISION_SKIP_DOWNLOAD = 'skip_download'  # Kept in the catalog, but never downloaded
+DECISIONS = {DECISION_KEEP, DECISION_REMOVE, DECISION_SKIP_DOWNLOAD}
+DEFAULT_RULE_ID = 'default'
+
+
+def _digest(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:12]
+
+
+class FilterRule:
+    """
+    A single rule of the rule file: if a video's channel is in scope and its title satisfies the title conditions,
+    the rule decides the video. A title condition referencing only empty keyword sets never matches.
+    """
+
+    def __init__(self, spec: dict, keyword_sets: Dict[str, List[str]]):
+        self.id = spec['id']
+        self.decision = spec['decision']
+        if self.decision not in DECISIONS:
+            raise ValueError(f"Rule {self.id}: unknown decision {self.decision!r}, expected one of {sorted(DECISIONS)}")
+        self.channels = {channel.lower() for channel in spec['channels']} if 'channels' in spec else None
+        self.except_channels = {channel.lower() for channel in spec.get('except_channels', [])}
+        self.contains = self._matcher(spec, 'title_contains', keyword_sets)
+        self.lacks = self._matcher(spec, 'title_lacks', keyword_sets)
+        # The expanded keywords are part of the spec so that editing a keyword set changes the tables using it
+        self.spec = {**spec, **{key: self._keywords(spec, key, keyword_sets) for key in ('title_contains', 'title_lacks') if key in spec}}
+
+    def _keywords(self, spec: dict, key: str, keyword_sets: Dict[str, List[str]]) -> List[str]:
+        unknown_sets = [name for name in spec[key] if name not in keyword_sets]
+        if unknown_sets:
+            raise ValueError(f"Rule {self.id}: unknown keyword sets {unknown_sets} in {key}")
+        return [keyword for name in spec[key] for keyword in keyword_sets[name]]
+
+    def _matcher(self, spec: dict, key: str, keyword_sets: Dict[str, List[str]]):
+        if key not in spec:
+            return None
+        return get_keyword_matcher(self._keywords(spec, key, keyword_sets), word_boundary=spec.get('word_boundary', False))
+
+    def applies_to_channel(self, channel: str) -> bool:
+        return (self.channels is None or channel in self.channels) and channel not in self.except_channels
+
+    def matches(self, title: str) -> bool:
+        if self.contains is not None and not self.contains.matches(title):
+            return False
+        if self.lacks is not None and (not self.lacks or self.lacks.matches(title)):
+            return False
+        return True
+
+    def match_series(self, titles: pd.Series) -> np.ndarray:
+        hits = np.ones(len(titles), dtype=bool)
+        if self.contains is not None:
+            hits &= self.contains.match_series(titles).to_numpy()
+        if self.lacks is not None:
+            hits &= ~self.lacks.match_series(titles).to_numpy() if self.lacks else False
+        return hits
+
+
+class FilterRules:
+    """
+    The title filtering rules, compiled from the declarative rule file into one decision table per channel.
+
+    The rule file holds named keyword sets and an ordered list of rules. A channel's decision table is the list of
+    rules in scope for it, evaluated in order: the first rule whose title conditions hold decides the video, and
+    videos no rule decides get default_decision. Each table has a signature, so that stored decisions only need to
+    be re-evaluated for channels whose table changed.
+    """
+
+    def __init__(self, spec: dict):
+        self.keyword_sets = spec.get('keyword_sets', {})
+        self.rules = [FilterRule(rule_spec, self.keyword_sets) for rule_spec in spec['rules']]
+        self.default_decision = spec.get('default_decision', DECISION_KEEP)
+        self.version = _digest(spec)
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, rules_file_path: str = FILTER_RULES_FILE_PATH) -> 'FilterRules':
+        with open(rules_file_path, 'r', encoding='utf-8') as file:
+            return cls(json.load(file))
+
+    def table(self, channel_name) -> Tuple[Tuple[FilterRule, ...], str]:
+        """
+        Returns the decision table of a channel and its signature, compiled once per channel.
+        """
+        channel = str(channel_name or '').strip().lower()
+        table = self._tables.get(channel)
+        if table is None:
+            rules = tuple(rule for rule in self.rules if rule.applies_to_channel(channel))
+            table = (rules, _digest({'rules': [rule.spec for rule in rules], 'default_decision': self.default_decision}))
+            with self._lock:
+                self._tables[channel] = table
+        return table
+
+    def channel_signature(self, channel_name) -> str:
+        return self.table(channel_name)[1]
+
+    def decide(self, channel_name, title) -> Tuple[str, str]:
+        """
+        Returns the decision for one video and the ID of the rule that made it.
+        """
+        title = title if isinstance(title, str) else ''
+        for rule in self.table(channel_name)[0]:
+            if rule.matches(title):
+                return rule.decision, rule.id
+        return self.default_decision, DEFAULT_RULE_ID
+
+    def annotate(self, video_info_list: List[dict]) -> List[dict]:
+        """
+        Stores the decision and rule ID in each video dictionary, in place.
+        """
+        for video_info in video_info_list:
+            video_info['decision'], video_info['rule_id'] = self.decide(video_info.get('channel_name'), video_info.get('title'))
+        return video_info_list
+
+    def decide_frame(self, df: pd.DataFrame) -> Tuple[pd.Series, pd.Series]:
+        """
+        Vectorized decide over a catalog DataFrame. Channels sharing a decision table are evaluated together, and each
+        rule only matches the titles that no earlier rule decided.
+
+        Returns:
+            Tuple[pd.Series, pd.Series]: The decision and the rule ID of every row.
+        """
+        decisions = np.full(len(df), self.default_decision, dtype=object)
+        rule_ids = np.full(len(df), DEFAULT_RULE_ID, dtype=object)
+        titles = df['title'].where(df['title'].map(lambda title: isinstance(title, str)), '')
+
+        channel_codes, channel_names = pd.factorize(df['channel_name'].fillna('').astype(str).str.strip().str.lower())
+        channels_per_table = {}
+        for code, channel in enumerate(channel_names):
+            rules, signature = self.table(channel)
+            channels_per_table.setdefault(signature, (rules, []))[1].append(code)
+
+        for rules, codes in channels_per_table.values():
+            undecided = np.flatnonzero(np.isin(channel_codes, codes))
+            for rule in rules:
+                if not len(undecided):
+                    break
+                hits = rule.match_series(titles.iloc[undecided])
+                decided = undecided[hits]
+                decisions[decided] = rule.decision
+                rule_ids[decided] = rule.id
+                undecided = undecided[~hits]
+
+        return pd.Series(decisions, index=df.index), pd.Series(rule_ids, index=df.index)
+
+
+_rules = None
+_rules_lock = threading.Lock()
+
+
+def get_filter_rules(rules_file_path: Optional[str] = None) -> FilterRules:
+    """
+    Returns the process-wide rules compiled from FILTER_RULES_FILE_PATH, or freshly loaded from rules_file_path.
+    """
+    global _rules
+    if rules_file_path:
+        return FilterRules.load(rules_file_path)
+    with _rules_lock:
+        if _rules is None:
+            _rules = FilterRules.load()
+        return _rules
@@ -0,0 +1,174 @@
+import json
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional
+
+from src.constants_and_keywords_to_filter import FS_OPERATION_JOURNAL_DIRECTORY
+
+ACTION_RENAME = 'rename'  # Rename or move a file or directory, the destination must not exist
+ACTION_DELETE = 'delete'  # Delete a file
+ACTION_RMTREE = 'rmtree'  # Delete a directory and its contents
+ACTION_RMDIR = 'rmdir'  # Delete a directory if it is empty
+
+
+class FsOperation(NamedTuple):
+    action: str
+    source: str
+    destination: Optional[str] = None
+
+    def paths(self) -> List[str]:
+        return [os.path.normpath(path) for path in (self.source, self.destination) if path]
+
+
+def _ancestors(path: str) -> List[str]:
+    ancestors = []
+    parent = os.path.dirname(path)
+    while parent and parent != path:
+        ancestors.append(parent)
+        path, parent = parent, os.path.dirname(parent)
+    return ancestors
+
+
+def schedule_operations(operations: List[FsOperation]) -> List[int]:
+    """
+    Returns the level of each operation: operations of a level touch no path that another operation of the same
+    level touches, contains or lies within, so they can run in parallel, while the levels run in order.
+
+    An operation is placed one level after the last earlier operation it conflicts with, found through the levels
+    recorded per path and per ancestor directory, in O(operations x path depth).
+    """
+    touched = {}  # path -> last level of the operations on that exact path
+    subtree = {}  # path -> last level of the operations on that path or anything within it
+    levels = []
+    for operation in operations:
+        paths = operation.paths()
+        conflicts = [subtree.get(path, -1) for path in paths]
+        conflicts += [touched.get(ancestor, -1) for path in paths for ancestor in _ancestors(path)]
+        level = max(conflicts, default=-1) + 1
+        for path in paths:
+            touched[path] = max(touched.get(path, -1), level)
+            for directory in [path] + _ancestors(path):
+                subtree[directory] = max(subtree.get(directory, -1), level)
+        levels.append(level)
+    return levels
+
+
+def _execute(operation: FsOperation) -> bool:
+    """
+    Executes an operation idempotently, so that rolling a journal forward may repeat an operation that completed
+    right before a crash. Returns False if the operation could not be applied.
+    """
+    action, source, destination = operation
+    if action == ACTION_RENAME:
+        if not os.path.lexists(source):
+            return os.path.lexists(destination)
+        if os.path.lexists(destination):
+            logging.warning(f"Not moving {source}: {destination} already exists")
+            return False
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.move(source, destination)
+    elif action == ACTION_DELETE:
+        if os.path.lexists(source):
+            os.remove(source)
+    elif action == ACTION_RMTREE:
+        if os.path.lexists(source):
+            shutil.rmtree(source)
+    elif action == ACTION_RMDIR:
+        if os.path.lexists(source):
+            if os.listdir(source):
+                logging.warning(f"Directory {source} is not empty after merge. Please check contents.")
+                return False
+            os.rmdir(source)
+    else:
+        raise ValueError(f"Unknown file system operation {action}")
+    logging.debug(f"{action} {source}" + (f" -> {destination}" if destination else ""))
+    return True
+
+
+class FsOperationJournal:
+    """
+    A planned batch of file system operations, journaled so that an interrupted batch can be rolled forward.
+
+    The whole plan is written to the journal before anything is touched, then each operation appends a done marker
+    when it completes. The journal is removed once the batch is complete, so an existing journal means that a batch
+    was interrupted, and roll_forward executes its remaining operations.
+    """
+
+    def __init__(self, name: str, journal_directory: str = FS_OPERATION_JOURNAL_DIRECTORY,
+                 workers: int = int(os.environ.get('FS_OPERATION_WORKERS', 16))):
+        self.journal_path = os.path.join(journal_directory, f"{name}.jsonl")
+        self.workers = workers
+        self._lock = threading.Lock()
+
+    def _write_plan(self, operations: List[FsOperation], levels: List[int]):
+        os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+        tmp_path = f"{self.journal_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            for operation_id, (operation, level) in enumerate(zip(operations, levels)):
+                file.write(json.dumps({'id': operation_id, 'level': level, **operation._asdict()}, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.journal_path)
+
+    def _load(self):
+        operations, done = {}, set()
+        with open(self.journal_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn done marker, the operation is repeated, which is harmless as operations are idempotent
+                    continue
+                if 'done' in record:
+                    done.add(record['done'])
+                else:
+                    operations[record['id']] = (record['level'], FsOperation(record['action'], record['source'], record['destination']))
+        return [(operation_id, level, operation) for operation_id, (level, operation) in operations.items() if operation_id not in done]
+
+    def _run(self, pending) -> int:
+        applied = 0
+
+        def run_one(operation_id: int, operation: FsOperation) -> bool:
+            try:
+                succeeded = _execute(operation)
+            except OSError as e:
+                logging.error(f"{operation.action} {operation.source} failed: {e}")
+                succeeded = False
+            # Failed operations are marked done as well, rolling forward would only fail them again
+            with self._lock, open(self.journal_path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps({'done': operation_id}) + '\n')
+            return succeeded
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for level in sorted({level for _, level, _ in pending}):
+                batch = [(operation_id, operation) for operation_id, operation_level, operation in pending if operation_level == level]
+                applied += sum(executor.map(lambda item: run_one(*item), batch))
+        os.remove(self.journal_path)
+        return applied
+
+    def run(self, operations: List[FsOperation]) -> int:
+        """
+        Journals and executes a batch, in parallel within each level of schedule_operations.
+
+        Returns:
+            int: The number of operations applied.
+        """
+        if not operations:
+            return 0
+        levels = schedule_operations(operations)
+        self._write_plan(operations, levels)
+        return self._run([(operation_id, level, operation) for operation_id, (operation, level) in enumerate(zip(operations, levels))])
+
+    def roll_forward(self) -> int:
+        """
+        Executes the remaining operations of an interrupted batch, if there is one.
+
+        Returns:
+            int: The number of operations applied.
+        """
+        if not os.path.exists(self.journal_path):
+            return 0
+        pending = self._load()
+        logging.info(f"Rolling forward {len(pending)} operations of the interrupted batch {self.journal_path}")
+        return self._run(pending)
@@ -0,0 +1,86 @@
+import re
+from functools import lru_cache
+from typing import Iterable, Optional
+
+import pandas as pd
+
+
+def _trie_regex(keywords: Iterable[str], prune_extensions: bool) -> str:
+    """
+    Compiles keywords into a single regex shaped like a trie, so that keywords sharing a prefix are tried once per
+    position instead of once per keyword.
+
+    Args:
+        keywords (Iterable[str]): Lowercased keywords.
+        prune_extensions (bool): Drop keywords that extend another keyword, which can never change whether a text
+            matches when keywords are matched as plain substrings.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        is_terminal = '' in node
+        if is_terminal and (prune_extensions or len(node) == 1):
+            return ''
+        alternatives = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        body = alternatives[0] if len(alternatives) == 1 else f"(?:{'|'.join(alternatives)})"
+        if is_terminal:
+            return f"(?:{body})?" if len(alternatives) == 1 else f"{body}?"
+        return body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """
+    Matches a list of keywords against titles with one precompiled, escaped regex.
+
+    Keywords are matched as literal text, case-insensitively by default, and optionally only on word boundaries.
+    An empty keyword list matches nothing.
+    """
+
+    def __init__(self, keywords: Iterable[str], word_boundary: bool = False, case_insensitive: bool = True):
+        self.keywords = [keyword for keyword in dict.fromkeys(keywords) if keyword]
+        self.word_boundary = word_boundary
+        self.case_insensitive = case_insensitive
+
+        if not self.keywords:
+            self.regex = re.compile(r'(?!)')  # Never matches
+            return
+
+        normalized_keywords = [keyword.lower() if case_insensitive else keyword for keyword in self.keywords]
+        pattern = _trie_regex(normalized_keywords, prune_extensions=not word_boundary)
+        if word_boundary:
+            # Lookarounds rather than \b so that keywords starting or ending with punctuation, e.g. '#shorts', also work
+            pattern = rf'(?<!\w)(?:{pattern})(?!\w)'
+        self.regex = re.compile(pattern, re.IGNORECASE if case_insensitive else 0)
+
+    def __bool__(self):
+        return bool(self.keywords)
+
+    def matches(self, text: Optional[str]) -> bool:
+        return isinstance(text, str) and self.regex.search(text) is not None
+
+    def match_series(self, texts: pd.Series) -> pd.Series:
+        """
+        Vectorized match over a whole column, missing values never match.
+        """
+        if not self.keywords:
+            return pd.Series(False, index=texts.index)
+        return texts.str.contains(self.regex, na=False)
+
+
+@lru_cache(maxsize=None)
+def _cached_keyword_matcher(keywords: tuple, word_boundary: bool, case_insensitive: bool) -> KeywordMatcher:
+    return KeywordMatcher(keywords, word_boundary=word_boundary, case_insensitive=case_insensitive)
+
+
+def get_keyword_matcher(keywords: Optional[Iterable[str]], word_boundary: bool = False, case_insensitive: bool = True) -> KeywordMatcher:
+    """
+    Returns the matcher for a keyword list, compiled once per distinct list and options for the whole process.
+    """
+    return _cached_keyword_matcher(tuple(keywords or ()), word_boundary, case_insensitive)
@@ -0,0 +1,207 @@
+import atexit
+import hashlib
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, List, Optional
+from zoneinfo import ZoneInfo
+
+from googleapiclient.errors import HttpError
+
+from src.constants_and_keywords_to_filter import QUOTA_LEDGER_FILE_PATH
+
+# Unit cost of each YouTube Data API endpoint, see https://developers.google.com/youtube/v3/determine_quota_cost
+ENDPOINT_COSTS = {
+    'search.list': 100,
+    'channels.list': 1,
+    'playlists.list': 1,
+    'playlistItems.list': 1,
+    'videos.list': 1,
+}
+
+# The daily quota resets at midnight Pacific time
+QUOTA_TIMEZONE = ZoneInfo('America/Los_Angeles')
+
+# Reasons of the 403 errors meaning that a key has no quota left today, as opposed to rate limiting
+QUOTA_EXCEEDED_REASONS = ('quotaExceeded', 'dailyLimitExceeded')
+
+
+class QuotaExceededError(Exception):
+    pass
+
+
+def is_quota_exceeded(error: Exception) -> bool:
+    """
+    Returns True if a googleapiclient error is a 403 reporting that the key's daily quota is used up.
+    """
+    if not isinstance(error, HttpError) or error.resp.status != 403:
+        return False
+    details = error.error_details if isinstance(error.error_details, list) else []
+    reasons = {detail.get('reason') for detail in details if isinstance(detail, dict)}
+    return bool(reasons.intersection(QUOTA_EXCEEDED_REASONS)) or any(reason in str(error.content) for reason in QUOTA_EXCEEDED_REASONS)
+
+
+def _key_fingerprint(api_key: str) -> str:
+    # API keys are never written to disk, spending is recorded against a short hash of the key
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12]
+
+
+class QuotaScheduler:
+    """
+    Central accounting of YouTube Data API quota across one or more API keys.
+
+    Every call acquires a key for its endpoint: the scheduler rotates across the keys that still have enough of
+    their daily budget left, refuses expensive calls once a key's remaining budget falls into the reserve kept for
+    cheap calls, and persists the units spent per key and day so that resumed runs know what is left.
+    """
+
+    def __init__(self, api_keys: List[str], daily_budget: int = 10000, cheap_call_reserve: float = 0.1, ledger_path: str = QUOTA_LEDGER_FILE_PATH):
+        self.api_keys = []
+        self.daily_budget = daily_budget
+        self.cheap_call_reserve = int(daily_budget * cheap_call_reserve)
+        self.ledger_path = ledger_path
+        self._lock = threading.Lock()
+        self._day = self._today()
+        self._spent = {}
+        self._spent_by_endpoint = {}
+        self._rotation = itertools.cycle([])
+        self._last_saved = 0.0
+        self._load()
+        for api_key in api_keys:
+            self.add_key(api_key)
+
+    @classmethod
+    def from_env(cls) -> 'QuotaScheduler':
+        api_keys = os.environ.get('YOUTUBE_API_KEYS') or os.environ.get('YOUTUBE_API_KEY') or ''  # Expecting a comma-separated list of API keys
+        scheduler = cls(
+            [api_key.strip() for api_key in api_keys.split(',') if api_key.strip()],
+            daily_budget=int(os.environ.get('YOUTUBE_API_DAILY_QUOTA', 10000)),
+        )
+        atexit.register(scheduler.save)
+        return scheduler
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(QUOTA_TIMEZONE).strftime("%Y-%m-%d")
+
+    def _load(self):
+        if not os.path.exists(self.ledger_path):
+            return
+        with open(self.ledger_path, 'r', encoding='utf-8') as file:
+            ledger = json.load(file)
+        if ledger.get('date') == self._day:
+            self._spent = ledger.get('spent', {})
+            self._spent_by_endpoint = ledger.get('spent_by_endpoint', {})
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.ledger_path), exist_ok=True)
+        tmp_path = f"{self.ledger_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'date': self._day, 'spent': self._spent, 'spent_by_endpoint': self._spent_by_endpoint}, file, indent=4)
+        os.replace(tmp_path, self.ledger_path)
+        self._last_saved = time.monotonic()
+
+    def _roll_over_if_new_day(self):
+        today = self._today()
+        if today != self._day:
+            self._day, self._spent, self._spent_by_endpoint = today, {}, {}
+
+    def add_key(self, api_key: Optional[str]):
+        with self._lock:
+            if api_key and api_key not in self.api_keys:
+                self.api_keys.append(api_key)
+                self._rotation = itertools.cycle(list(self.api_keys))
+
+    def mark_exhausted(self, api_key: str):
+        """
+        Records that the API reported the key's quota as exceeded, e.g. because it is shared with another project.
+        """
+        with self._lock:
+            self._spent[_key_fingerprint(api_key)] = self.daily_budget
+            self._save()
+
+    def remaining(self, api_key: str) -> int:
+        return self.daily_budget - self._spent.get(_key_fingerprint(api_key), 0)
+
+    def acquire(self, endpoint: str) -> str:
+        """
+        Reserves the cost of one call to endpoint and returns the API key to make it with.
+
+        Raises:
+            QuotaExceededError: If no key has enough budget left for the call.
+        """
+        cost = ENDPOINT_COSTS[endpoint]
+        # Cheap calls may use the whole budget, expensive ones must leave the reserve untouched
+        required = cost if cost <= 1 else cost + self.cheap_call_reserve
+        with self._lock:
+            self._roll_over_if_new_day()
+            for _ in range(len(self.api_keys)):
+                api_key = next(self._rotation)
+                if self.remaining(api_key) >= required:
+                    fingerprint = _key_fingerprint(api_key)
+                    self._spent[fingerprint] = self._spent.get(fingerprint, 0) + cost
+                    self._spent_by_endpoint[endpoint] = self._spent_by_endpoint.get(endpoint, 0) + cost
+                    # Persist at most once per second, the remainder is written by save() at exit
+                    if cost > 1 or time.monotonic() - self._last_saved >= 1:
+                        self._save()
+                    return api_key
+        raise QuotaExceededError(f"No YouTube API key has {required} units left for {endpoint} today "
+                                 f"(spent: {sum(self._spent.values())} units across {len(self.api_keys)} keys).")
+
+    def log_spending(self):
+        logging.info(f"YouTube API quota spent today: {sum(self._spent.values())} units, by endpoint: {self._spent_by_endpoint}")
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_quota_scheduler() -> QuotaScheduler:
+    """
+    Returns the process-wide quota scheduler, configured from YOUTUBE_API_KEYS (or YOUTUBE_API_KEY) and YOUTUBE_API_DAILY_QUOTA.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = QuotaScheduler.from_env()
+        return _scheduler
+
+
+def execute_request(endpoint: str, build_request: Callable[[str], object], api_key: Optional[str] = None):
+    """
+    Executes a googleapiclient request through the quota scheduler.
+
+    If the API answers that the chosen key's quota is exceeded, e.g. because the key is shared with another project,
+    the key is marked exhausted and the request is made again with the next key that has enough units left.
+
+    Args:
+        endpoint (str): The endpoint name used for cost accounting, e.g. 'videos.list'.
+        build_request (Callable[[str], object]): Builds the request for the API key chosen by the scheduler.
+        api_key (Optional[str]): A key passed explicitly by the caller, added to the rotation if it is not known yet.
+
+    Returns:
+        dict: The response of the request.
+
+    Raises:
+        QuotaExceededError: If every key ran out of quota.
+    """
+    scheduler = get_quota_scheduler()
+    scheduler.add_key(api_key)
+    while True:
+        # Each retry marks one more key exhausted, acquire raises once no key is left
+        chosen_key = scheduler.acquire(endpoint)
+        try:
+            return build_request(chosen_key).execute()
+        except HttpError as e:
+            if not is_quota_exceeded(e):
+                raise
+            logging.warning(f"{endpoint} quota exceeded for API key {_key_fingerprint(chosen_key)}, retrying with another key")
+            scheduler.mark_exhausted(chosen_key)
@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+
+def split_new_playlist_items(items: List[dict], high_water_mark: Optional[dict]) -> Tuple[List[dict], bool]:
+    """
+    Splits a page of playlistItems.list results into the items newer than the channel's high-water mark.
+
+    Uploads are returned newest-first, so the first item that is the high-water video, or that was published at or
+    before it, means that everything after it has already been ingested.
+
+    Args:
+        items (List[dict]): The 'items' of a playlistItems.list response with the snippet part.
+        high_water_mark (Optional[dict]): The channel's mark as returned by ChannelSyncState.high_water_mark.
+
+    Returns:
+        Tuple[List[dict], bool]: The new items, and whether a known item was reached so that paging can stop.
+    """
+    if not high_water_mark:
+        return items, False
+    new_items = []
+    for item in items:
+        video_id = item["snippet"]["resourceId"]["videoId"]
+        published_at = item["snippet"].get("publishedAt", "")
+        if video_id == high_water_mark['video_id'] or (published_at and published_at <= high_water_mark['published_at']):
+            return new_items, True
+        new_items.append(item)
+    return new_items, False
+
+
+def newest_playlist_item(items: List[dict]) -> Optional[dict]:
+    """
+    Returns the high-water mark ({'video_id', 'published_at'}) of the newest item in a list of playlist items.
+    """
+    items = [item for item in items if item["snippet"].get("publishedAt")]
+    if not items:
+        return None
+    newest = max(items, key=lambda item: item["snippet"]["publishedAt"])
+    return {'video_id': newest["snippet"]["resourceId"]["videoId"], 'published_at': newest["snippet"]["publishedAt"]}
+
+
+class ChannelSyncState:
+    """
+    Persistent per-channel high-water marks recording the newest upload already ingested.
+
+    Marks are staged while a channel is being listed and only committed once its videos have been saved, so an
+    interrupted run never skips videos it did not ingest. With full_resync every channel is listed from scratch,
+    and the marks are refreshed on commit.
+    """
+
+    def __init__(self, state_file_path: str, full_resync: bool = False):
+        self.state_file_path = state_file_path
+        self.full_resync = full_resync
+        self._marks = {}
+        self._staged = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, state_file_path: str, full_resync: bool = False) -> 'ChannelSyncState':
+        sync_state = cls(state_file_path, full_resync)
+        if os.path.exists(state_file_path):
+            with open(state_file_path, 'r', encoding='utf-8') as file:
+                sync_state._marks = json.load(file)
+        if full_resync:
+            logging.info("Full resync requested, ignoring the channel high-water marks.")
+        return sync_state
+
+    def high_water_mark(self, channel_id: str) -> Optional[dict]:
+        if self.full_resync:
+            return None
+        return self._marks.get(channel_id)
+
+    def stage(self, channel_id: str, mark: Optional[dict]):
+        """
+        Stages the newest item seen while listing a channel, keeping the current mark if nothing newer was listed.
+        """
+        if mark:
+            self._staged[channel_id] = mark
+
+    def commit(self, channel_id: str):
+        """
+        Promotes the staged mark of a channel and persists the state atomically.
+        """
+        mark = self._staged.pop(channel_id, None)
+        if not mark:
+            return
+        with self._lock:
+            self._marks[channel_id] = {**mark, 'synced_at': datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")}
+            os.makedirs(os.path.dirname(self.state_file_path), exist_ok=True)
+            tmp_path = f"{self.state_file_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(self._marks, file, ensure_ascii=False, indent=4)
+            os.replace(tmp_path, self.state_file_path)
@@ -0,0 +1,185 @@
+import json
+import logging
+import os
+import random
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+from src.constants_and_keywords_to_filter import FILTER_RULES_STATE_FILE_PATH, YOUTUBE_VIDEOS_CSV_FILE_PATH, FILTERED_AWAY_CSV_FILE_PATH
+from src.utils.catalog import CATALOG_HEADERS, CatalogWriter, VideoCatalog, video_ids_from_urls, write_csv_atomically
+from src.utils.filter_rules import FilterRules, DECISIONS, DECISION_REMOVE, get_filter_rules
+
+
+class FilterDiff(NamedTuple):
+    newly_kept: pd.DataFrame  # Rows moved back from the filtered-away store into the catalog
+    newly_removed: pd.DataFrame  # Rows moved from the catalog into the filtered-away store
+    re_evaluated: int  # Number of rows whose decision was evaluated again, 0 for a no-op re-filter
+
+
+def load_filter_state(state_file_path: str = FILTER_RULES_STATE_FILE_PATH) -> dict:
+    """
+    Loads the rule version and per-channel decision table signatures the catalog's stored decisions were made with.
+    """
+    if not os.path.exists(state_file_path):
+        return {}
+    with open(state_file_path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_filter_state(filter_rules: FilterRules, channel_signatures: Dict[str, str], catalog_fingerprint: Optional[list] = None,
+                      state_file_path: str = FILTER_RULES_STATE_FILE_PATH):
+    os.makedirs(os.path.dirname(state_file_path), exist_ok=True)
+    tmp_path = f"{state_file_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump({'version': filter_rules.version, 'catalog_fingerprint': catalog_fingerprint, 'channel_signatures': channel_signatures},
+                  file, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, state_file_path)
+
+
+def _file_fingerprint(file_path: str) -> Optional[list]:
+    # Size and modification time, enough to tell whether the catalog was written since it was last filtered
+    if not os.path.exists(file_path):
+        return None
+    stat = os.stat(file_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def refresh_decisions(df: pd.DataFrame, filter_rules: FilterRules, channel_signatures: Optional[Dict[str, str]] = None) -> Tuple[pd.Series, Dict[str, str]]:
+    """
+    Re-evaluates, in place, the decision and rule_id columns of the rows that have no decision yet or whose channel's
+    decision table changed since channel_signatures was saved. Rows of unchanged channels keep their stored decision.
+
+    Returns:
+        Tuple[pd.Series, Dict[str, str]]: The mask of re-evaluated rows, and the current signature of every channel in df.
+    """
+    for column in ('decision', 'rule_id'):
+        if column not in df.columns:
+            df[column] = ''
+    channels = df['channel_name'].fillna('').astype(str).str.strip().str.lower()
+    current_signatures = {channel: filter_rules.channel_signature(channel) for channel in channels.unique()}
+    changed_channels = [channel for channel, signature in current_signatures.items() if (channel_signatures or {}).get(channel) != signature]
+
+    stale = channels.isin(changed_channels) | ~df['decision'].isin(DECISIONS)
+    if stale.any():
+        decisions, rule_ids = filter_rules.decide_frame(df[stale])
+        df.loc[stale, 'decision'] = decisions
+        df.loc[stale, 'rule_id'] = rule_ids
+    return stale, current_signatures
+
+
+def partition_videos(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Splits the catalog on its decision column into the rows kept and the rows removed, both in catalog order.
+    """
+    removed = (df['decision'] == DECISION_REMOVE).to_numpy()
+    return df[~removed], df[removed]
+
+
+def _read_store(csv_file_path: str) -> pd.DataFrame:
+    # The catalog and filtered-away CSVs share CATALOG_HEADERS, older files are completed with empty columns
+    if not os.path.exists(csv_file_path):
+        return pd.DataFrame(columns=CATALOG_HEADERS)
+    df = pd.read_csv(csv_file_path, encoding='utf-8', dtype=str, keep_default_na=False)
+    for header in CATALOG_HEADERS:
+        if header not in df.columns:
+            df[header] = ''
+    missing_video_ids = df['video_id'] == ''
+    if missing_video_ids.any():
+        df.loc[missing_video_ids, 'video_id'] = video_ids_from_urls(df.loc[missing_video_ids, 'url'])
+    return df
+
+
+def _drop_duplicate_video_ids(df: pd.DataFrame, keep: str = 'first') -> pd.DataFrame:
+    # Rows without a video ID cannot be told apart and are all kept
+    return df[~((df['video_id'] != '') & df.duplicated(subset='video_id', keep=keep))]
+
+
+def refilter_catalog(filter_rules: FilterRules, catalog_csv_path: str = YOUTUBE_VIDEOS_CSV_FILE_PATH,
+                     filtered_away_csv_path: str = FILTERED_AWAY_CSV_FILE_PATH, state_file_path: str = FILTER_RULES_STATE_FILE_PATH) -> FilterDiff:
+    """
+    Brings the catalog and the filtered-away store in line with the current rules, touching only what changed.
+
+    If neither the rule version nor the catalog file changed since the last re-filter, nothing is read at all.
+    Otherwise only rows without a decision or of channels whose decision table changed are evaluated again, in both
+    stores: rows the rules now remove move to the filtered-away store, and filtered-away rows the rules now keep move
+    back to the catalog. Both stores are deduplicated by video ID, and each is only written if its content changed,
+    by appending when rows are only added.
+
+    Returns:
+        FilterDiff: The rows moved between the two stores.
+    """
+    filter_state = load_filter_state(state_file_path)
+    if filter_state.get('version') == filter_rules.version and filter_state.get('catalog_fingerprint') == _file_fingerprint(catalog_csv_path):
+        return FilterDiff(pd.DataFrame(columns=CATALOG_HEADERS), pd.DataFrame(columns=CATALOG_HEADERS), 0)
+    previous_signatures = filter_state.get('channel_signatures')
+
+    catalog_df = _read_store(catalog_csv_path)
+    previous_decisions = catalog_df[['decision', 'rule_id']].copy()
+    catalog_stale, channel_signatures = refresh_decisions(catalog_df, filter_rules, previous_signatures)
+    kept_df, newly_removed_df = partition_videos(catalog_df)
+
+    filtered_away_df = _read_store(filtered_away_csv_path)
+    filtered_away_stale, filtered_away_signatures = refresh_decisions(filtered_away_df, filter_rules, previous_signatures)
+    newly_kept_df, remaining_away_df = partition_videos(filtered_away_df)
+    newly_kept_df = _drop_duplicate_video_ids(newly_kept_df, keep='last')
+    newly_kept_df = newly_kept_df[~newly_kept_df['video_id'].isin(kept_df['video_id'][kept_df['video_id'] != ''])]
+
+    decisions_changed = (previous_decisions != catalog_df[['decision', 'rule_id']]).any(axis=1)
+    has_duplicates = len(_drop_duplicate_video_ids(kept_df)) != len(kept_df)
+    if not newly_removed_df.empty or decisions_changed.any() or has_duplicates:
+        write_csv_atomically(_drop_duplicate_video_ids(pd.concat([kept_df, newly_kept_df]))[CATALOG_HEADERS], catalog_csv_path)
+    elif not newly_kept_df.empty:
+        # The rows are already deduplicated against the catalog, the writer checks the torn tail and fsyncs the append
+        with CatalogWriter(catalog_csv_path, VideoCatalog(), CATALOG_HEADERS) as catalog_writer:
+            catalog_writer.add_rows(newly_kept_df[CATALOG_HEADERS].to_dict('records'))
+
+    if not newly_removed_df.empty or not newly_kept_df.empty or filtered_away_stale.any():
+        os.makedirs(os.path.dirname(filtered_away_csv_path), exist_ok=True)
+        # The latest removal of a video wins over the copies older runs appended
+        write_csv_atomically(_drop_duplicate_video_ids(pd.concat([remaining_away_df, newly_removed_df]), keep='last')[CATALOG_HEADERS], filtered_away_csv_path)
+
+    save_filter_state(filter_rules, {**filtered_away_signatures, **channel_signatures}, _file_fingerprint(catalog_csv_path), state_file_path)
+    return FilterDiff(newly_kept_df, newly_removed_df, int(catalog_stale.sum() + filtered_away_stale.sum()))
+
+
+def format_filter_diff(diff: FilterDiff) -> str:
+    """
+    Formats the rows moved by a re-filter, one line per video: '+' moved back into the catalog, '-' filtered away.
+    """
+    lines = [f"Re-evaluated {diff.re_evaluated} videos: {len(diff.newly_kept)} newly kept, {len(diff.newly_removed)} newly removed."]
+    for sign, df in (('+', diff.newly_kept), ('-', diff.newly_removed)):
+        if not df.empty:
+            lines.extend(f"{sign} " + df['title'].astype(str) + " - Channel: " + df['channel_name'].astype(str) + " - Rule: " + df['rule_id'].astype(str))
+    return "\n".join(lines)
+
+
+def benchmark_decide_frame(n_rows: int = 1_000_000, n_channels: int = 300, seed: int = 0, rules_file_path: Optional[str] = None):
+    """
+    Times the vectorized rule evaluation on a synthetic catalog and checks it against per-video decide on a sample.
+    """
+    filter_rules = get_filter_rules(rules_file_path)
+    rng = random.Random(seed)
+    words = ['the', 'future', 'of', 'crypto', 'podcast', 'episode', 'interview', 'markets', 'update', 'with', 'q&a']
+    keyword_pool = [keyword for keywords in filter_rules.keyword_sets.values() for keyword in keywords]
+    channel_names = sorted({channel for rule in filter_rules.rules for channel in (rule.channels or set()) | rule.except_channels})
+    channel_names += [f'Channel {i}' for i in range(n_channels - len(channel_names))]
+    df = pd.DataFrame({
+        'title': [' '.join(rng.choice(words) for _ in range(6)) + (f" {rng.choice(keyword_pool)}" if rng.random() < 0.3 else '')
+                  for _ in range(n_rows)],
+        'channel_name': [rng.choice(channel_names) for _ in range(n_rows)],
+    })
+
+    start = time.perf_counter()
+    decisions, rule_ids = filter_rules.decide_frame(df)
+    seconds = time.perf_counter() - start
+
+    for position in rng.sample(range(n_rows), min(n_rows, 10000)):
+        row = df.iloc[position]
+        assert filter_rules.decide(row['channel_name'], row['title']) == (decisions.iloc[position], rule_ids.iloc[position])
+    print(f"{n_rows} rows: decide_frame {seconds:.2f}s, decisions: {decisions.value_counts().to_dict()}")
+
+
+if __name__ == '__main__':
+    benchmark_decide_frame()
@@ -0,0 +1,149 @@
+import random
+import string
+import time
+from collections import Counter
+from typing import Callable, List, NamedTuple, Optional, Sequence
+
+from src.utils.artifact_index import normalize_title_key
+
+
+class TitleMatch(NamedTuple):
+    position: int  # Position of the matched title in the titles the index was built from
+    title: str
+    score: float  # 1.0 for an exact match of the normalized keys, the trigram Dice coefficient otherwise
+
+
+def title_match_key(title: str) -> str:
+    """
+    Normalizes a catalog title or an artifact file stem for matching: the artifact index key, casefolded, without
+    the double quotes that file names drop.
+    """
+    return normalize_title_key(str(title)).replace('"', '').casefold()
+
+
+def _trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    """
+    Index of catalog titles to match file names against, built once and queried per file.
+
+    A query is first looked up by its normalized key, which resolves file names that only differ from their title by
+    full-width characters, slashes, quotes, case or whitespace. Otherwise the titles sharing the most trigrams with
+    the query are retrieved from an inverted index and ranked by the Dice coefficient of their trigram sets.
+    Trigrams shared by more than max_posting_share of the titles carry little signal and are left out of retrieval.
+    Every position of a title is kept, so that callers can tell videos sharing a title apart, e.g. by date.
+    """
+
+    def __init__(self, titles: Sequence[str], max_posting_share: float = 0.01, candidates: int = 20):
+        self.titles = [str(title) for title in titles]
+        self.candidates = candidates
+        self._by_key = {}  # key -> positions of the titles with that key
+        self._trigram_sets = []
+        postings = {}
+        for position, title in enumerate(self.titles):
+            key = title_match_key(title)
+            self._by_key.setdefault(key, []).append(position)
+            trigrams = _trigrams(key)
+            self._trigram_sets.append(trigrams)
+            for trigram in trigrams:
+                postings.setdefault(trigram, []).append(position)
+        max_postings = max(1, int(max_posting_share * len(self.titles)))
+        self._postings = {trigram: positions for trigram, positions in postings.items() if len(positions) <= max_postings}
+
+    def positions(self, title: str) -> List[int]:
+        """
+        Returns the positions of every title with the same normalized key as title.
+        """
+        return list(self._by_key.get(title_match_key(title), []))
+
+    def match(self, query: str, min_score: float = 0.5, accept: Optional[Callable[[int], bool]] = None) -> Optional[TitleMatch]:
+        """
+        Returns the catalog title best matching query, or None if no title scores at least min_score.
+
+        Args:
+            query (str): A title or file stem, with or without its date prefix.
+            min_score (float): The lowest acceptable trigram Dice coefficient.
+            accept (Optional[Callable[[int], bool]]): If given, only the positions it accepts can match, e.g. the
+                videos of one channel published on a given date.
+
+        Returns:
+            Optional[TitleMatch]: The matched title, its position and score.
+        """
+        key = title_match_key(query)
+        for position in self._by_key.get(key, []):
+            if accept is None or accept(position):
+                return TitleMatch(position, self.titles[position], 1.0)
+
+        query_trigrams = _trigrams(key)
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(self._postings.get(trigram, ()))
+        if accept is not None:
+            shared = Counter({position: count for position, count in shared.items() if accept(position)})
+        best = None
+        for position, _ in shared.most_common(self.candidates):
+            trigrams = self._trigram_sets[position]
+            score = 2 * len(query_trigrams & trigrams) / (len(query_trigrams) + len(trigrams))
+            if score >= min_score and (best is None or score > best.score):
+                best = TitleMatch(position, self.titles[position], score)
+        return best
+
+
+def _positional_overlap_match(video_title: str, titles: List[str]) -> Optional[str]:
+    # The scan TitleIndex replaced: the title with the most equal characters at equal positions, kept as the baseline
+    max_overlap, best_match = 0, None
+    for title in titles:
+        overlap = sum(1 for a, b in zip(video_title, title) if a == b)
+        if overlap > max_overlap:
+            max_overlap, best_match = overlap, title
+    return best_match
+
+
+def benchmark_title_index(n_titles: int = 50_000, n_files: int = 5_000, n_baseline_files: int = 50, seed: int = 0):
+    """
+    Times matching file names against a synthetic catalog with the index and with the former positional scan,
+    the latter on a sample and extrapolated, and reports how often each finds the title a file was made from.
+
+    File names are derived from titles the way yt-dlp and the movers alter them: full-width colons and slashes,
+    dropped quotes, doubled spaces, a date prefix, and for half of them a few characters changed.
+    """
+    rng = random.Random(seed)
+    words = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 9))) for _ in range(3000)]
+    titles = [' '.join(rng.choice(words).capitalize() for _ in range(rng.randint(4, 12))) + rng.choice(['', ': Panel', ' | Talk', ' "Live"'])
+              for _ in range(n_titles)]
+
+    def file_stem(title: str) -> str:
+        stem = title.replace(':', '：').replace('/', '⧸').replace('"', '').replace(' ', '  ', 1)
+        if rng.random() < 0.5:
+            characters = list(stem)
+            for _ in range(3):
+                characters[rng.randrange(len(characters))] = rng.choice(string.ascii_lowercase)
+            stem = ''.join(characters)
+        return f"2024-01-01_{stem}"
+
+    targets = rng.sample(range(n_titles), n_files)
+    stems = [file_stem(titles[target]) for target in targets]
+
+    start = time.perf_counter()
+    index = TitleIndex(titles)
+    build_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    matches = [index.match(stem) for stem in stems]
+    match_seconds = time.perf_counter() - start
+    index_correct = sum(match is not None and titles[match.position] == titles[target] for match, target in zip(matches, targets))
+
+    start = time.perf_counter()
+    baseline = [_positional_overlap_match(stem, titles) for stem in stems[:n_baseline_files]]
+    baseline_seconds = (time.perf_counter() - start) * n_files / n_baseline_files
+    baseline_correct = sum(match == titles[target] for match, target in zip(baseline, targets))
+
+    print(f"{n_titles} titles x {n_files} files: index built in {build_seconds:.2f}s, matched in {match_seconds:.2f}s, "
+          f"{index_correct / n_files:.1%} correct; positional scan ~{baseline_seconds:.0f}s (extrapolated from {n_baseline_files} files), "
+          f"{baseline_correct / n_baseline_files:.1%} correct")
+
+
+if __name__ == '__main__':
+    benchmark_title_index()
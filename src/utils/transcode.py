@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+# Audio files the pipeline works with: the mp3 it transcodes to, and the native bestaudio containers YouTube serves,
+# which diarization accepts as they are when transcoding is disabled
+AUDIO_FILE_EXTENSIONS = ('.mp3', '.opus', '.m4a', '.webm', '.ogg')
+
+
+def transcode_to_mp3(source_path: str, bitrate: str = '192k', remove_source: bool = True) -> str:
+    """
+    Transcodes an audio file to mp3 with ffmpeg.
+
+    The mp3 is written to a temporary file and renamed into place, so a crash never leaves a truncated mp3 that
+    looks complete to the later stages.
+
+    Args:
+        source_path (str): The downloaded native audio file.
+        bitrate (str): The mp3 bitrate.
+        remove_source (bool): Delete the native file once the mp3 exists.
+
+    Returns:
+        str: The path of the mp3 file.
+    """
+    mp3_path = f"{os.path.splitext(source_path)[0]}.mp3"
+    if source_path == mp3_path:
+        return mp3_path
+    tmp_path = f"{mp3_path}.part"
+    subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-i', source_path, '-vn', '-codec:a', 'libmp3lame', '-b:a', bitrate, '-f', 'mp3', tmp_path],
+                   check=True, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    os.replace(tmp_path, mp3_path)
+    if remove_source:
+        os.remove(source_path)
+    return mp3_path
+
+
+class TranscodePool:
+    """
+    Second stage of the download pipeline: transcodes downloaded audio to mp3 in a process pool sized to the cores,
+    while the download stage keeps fetching.
+    """
+
+    def __init__(self, max_workers: int = int(os.environ.get('TRANSCODE_WORKERS', os.cpu_count() or 1)), bitrate: str = '192k'):
+        self.bitrate = bitrate
+        self._executor = ProcessPoolExecutor(max_workers=max_workers)
+
+    async def transcode(self, source_path: str, progress=None) -> Optional[str]:
+        """
+        Returns the mp3 path, or None if ffmpeg failed, in which case the native file is kept. The job is counted as
+        transcoding in progress, the download scheduler's DownloadProgress, if given.
+        """
+        if progress:
+            progress.move(None, 'transcoding')
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, transcode_to_mp3, source_path, self.bitrate)
+        except subprocess.CalledProcessError as e:
+            logging.error(f"Transcoding {source_path} failed: {e.stderr.decode('utf-8', errors='replace').strip()}")
+        except Exception as e:
+            logging.error(f"Transcoding {source_path} failed: {e}")
+        finally:
+            if progress:
+                progress.move('transcoding', None)
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._executor.shutdown(wait=True)
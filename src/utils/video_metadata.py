@@ -0,0 +1,196 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from yt_dlp import DownloadError
+
+from src.constants_and_keywords_to_filter import VIDEO_METADATA_CACHE_FILE_PATH
+from src.utils.download_errors import CircuitBreaker, DownloadFailed, classify_download_error
+from src.utils.ytdl_pool import discard_youtube_dl, get_youtube_dl
+
+# Options of the metadata pre-flight: nothing is downloaded, and upcoming streams without formats yet are returned
+# with their live status instead of failing
+PREFLIGHT_YDL_OPTS = {'format': 'bestaudio/best', 'quiet': True, 'no_warnings': True, 'ignore_no_formats_error': True}
+
+# Live statuses of videos that cannot be downloaded as a complete recording yet
+UNFINISHED_LIVE_STATUSES = {'is_live', 'is_upcoming', 'post_live'}
+
+MAX_AUDIO_DURATION_SECONDS = int(os.environ.get('MAX_AUDIO_DURATION_SECONDS', 4 * 3600))
+MIN_AUDIO_BITRATE_KBPS = float(os.environ.get('MIN_AUDIO_BITRATE_KBPS', 64))
+
+
+def summarize_info(info: dict) -> dict:
+    """
+    Reduces a yt-dlp info dict to what the download stage decides on: live status, duration and the audio-only formats.
+    """
+    live_status = info.get('live_status') or ('is_live' if info.get('is_live') else None)
+    audio_formats = [
+        {'format_id': fmt['format_id'], 'ext': fmt.get('ext'), 'acodec': fmt.get('acodec'), 'abr': fmt.get('abr'),
+         'filesize': fmt.get('filesize') or fmt.get('filesize_approx')}
+        for fmt in info.get('formats') or []
+        if fmt.get('format_id') and fmt.get('vcodec') == 'none' and fmt.get('acodec') not in (None, 'none')
+    ]
+    return {'video_id': info.get('id'), 'live_status': live_status, 'duration': info.get('duration'),
+            'audio_formats': audio_formats, 'fetched_at': time.time()}
+
+
+def skip_reason(metadata: dict, max_duration: int = MAX_AUDIO_DURATION_SECONDS) -> Optional[str]:
+    """
+    Returns why a video should not be downloaded (live, upcoming or too long), or None if it should.
+    """
+    if metadata.get('live_status') in UNFINISHED_LIVE_STATUSES:
+        return metadata['live_status']
+    if max_duration and (metadata.get('duration') or 0) > max_duration:
+        return f"longer than {max_duration}s ({metadata['duration']}s)"
+    return None
+
+
+def select_audio_format(metadata: dict, min_bitrate: float = MIN_AUDIO_BITRATE_KBPS) -> str:
+    """
+    Returns the yt-dlp format selector of the smallest audio-only format of at least min_bitrate kbps, which is
+    plenty for speech, falling back to the best audio if no known format qualifies or the chosen one disappeared.
+
+    Args:
+        metadata (dict): A pre-flight summary as returned by summarize_info.
+        min_bitrate (float): The lowest acceptable audio bitrate in kbps.
+
+    Returns:
+        str: The format selector for the download's 'format' option.
+    """
+    formats = [fmt for fmt in metadata.get('audio_formats') or [] if fmt.get('abr')]
+    suitable = [fmt for fmt in formats if fmt['abr'] >= min_bitrate]
+    if not suitable:
+        return 'bestaudio/best'
+    duration = metadata.get('duration') or 0
+    smallest = min(suitable, key=lambda fmt: (fmt.get('filesize') or fmt['abr'] * 125 * duration, fmt['abr']))
+    return f"{smallest['format_id']}/bestaudio/best"
+
+
+class VideoMetadataCache:
+    """
+    Persistent cache of the pre-flight metadata of each video, keyed by video ID.
+
+    The cache is an append-only JSON lines journal where the last line of a video wins. Summaries of finished
+    videos never expire, those of live and upcoming videos expire after live_ttl seconds so that they are looked at
+    again once the recording is available. The full info dicts extracted during a run are also kept in memory until
+    their download starts, so that the first download attempt does not extract the video a second time.
+    """
+
+    def __init__(self, cache_file_path: str = VIDEO_METADATA_CACHE_FILE_PATH,
+                 live_ttl: float = float(os.environ.get('METADATA_LIVE_TTL_SECONDS', 3600)),
+                 concurrency: int = int(os.environ.get('METADATA_CONCURRENCY', 8)), circuit_breaker: Optional[CircuitBreaker] = None):
+        self.cache_file_path = cache_file_path
+        self.live_ttl = live_ttl
+        self.concurrency = concurrency
+        self.circuit_breaker = circuit_breaker
+        self.failures = {}  # video_id -> DownloadFailed of the extractions of this run that failed
+        self._entries = {}
+        self._infos = {}  # url -> full info dict of this run
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, cache_file_path: str = VIDEO_METADATA_CACHE_FILE_PATH, **kwargs) -> 'VideoMetadataCache':
+        cache = cls(cache_file_path, **kwargs)
+        lines = 0
+        if os.path.exists(cache_file_path):
+            with open(cache_file_path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    lines += 1
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn last line from an interrupted append, the video is extracted again
+                        continue
+                    cache._entries[entry['video_id']] = entry
+        if lines > 2 * len(cache._entries) + 100:
+            cache.compact()
+        logging.info(f"Loaded metadata of {len(cache._entries)} videos from {cache_file_path}")
+        return cache
+
+    def compact(self):
+        """
+        Rewrites the journal with the latest line of each video, atomically replacing the previous file.
+        """
+        os.makedirs(os.path.dirname(self.cache_file_path), exist_ok=True)
+        tmp_path = f"{self.cache_file_path}.tmp"
+        with self._lock:
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                for entry in self._entries.values():
+                    file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            os.replace(tmp_path, self.cache_file_path)
+
+    def get(self, video_id: str) -> Optional[dict]:
+        entry = self._entries.get(video_id)
+        if entry and entry.get('live_status') in UNFINISHED_LIVE_STATUSES and time.time() - entry['fetched_at'] > self.live_ttl:
+            return None
+        return entry
+
+    def add(self, video_id: str, info: dict, url: Optional[str] = None) -> dict:
+        """
+        Records the summary of an extracted info dict, and keeps the info dict itself for the download of url.
+        """
+        entry = {**summarize_info(info), 'video_id': video_id}
+        with self._lock:
+            self._entries[video_id] = entry
+            if url:
+                self._infos[url] = info
+            os.makedirs(os.path.dirname(self.cache_file_path), exist_ok=True)
+            with open(self.cache_file_path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        return entry
+
+    def take_info(self, url: str) -> Optional[dict]:
+        """
+        Returns and forgets the info dict extracted for url during this run, if any.
+        """
+        with self._lock:
+            return self._infos.pop(url, None)
+
+    def extract(self, video_id: str, url: str) -> Optional[dict]:
+        """
+        Extracts the metadata of a video with the calling thread's YoutubeDL, returning its summary or None on failure,
+        in which case the classified error is kept in failures.
+        """
+        if self.circuit_breaker:
+            self.circuit_breaker.wait()
+        try:
+            info = get_youtube_dl(PREFLIGHT_YDL_OPTS).extract_info(url, PREFLIGHT_YDL_OPTS, download=False)
+        except Exception as e:
+            # Any failure, not only yt-dlp's DownloadError, is confined to this video so that the rest of the
+            # pre-flight carries on
+            if not isinstance(e, DownloadError):
+                # Unexpected errors may leave the instance in an unknown state
+                discard_youtube_dl(PREFLIGHT_YDL_OPTS)
+            category = classify_download_error(e)
+            if self.circuit_breaker:
+                self.circuit_breaker.record(category)
+            logging.warning(f"Metadata extraction of {url} failed, {category} error: {e}")
+            self.failures[video_id] = DownloadFailed(category, str(e))
+            return None
+        if self.circuit_breaker:
+            self.circuit_breaker.record(None)
+        return self.add(video_id, info, url) if info else None
+
+    async def preflight(self, videos: List[dict]) -> Dict[str, Optional[dict]]:
+        """
+        Returns the metadata of each video ({'id', 'url'}), extracting those not in the cache, at most concurrency
+        at a time.
+
+        Returns:
+            Dict[str, Optional[dict]]: The summary per video ID, None for the videos whose extraction failed.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def metadata_of(video: dict) -> Optional[dict]:
+            entry = self.get(video['id'])
+            if entry is not None:
+                return entry
+            async with semaphore:
+                return await asyncio.to_thread(self.extract, video['id'], video['url'])
+
+        results = await asyncio.gather(*(metadata_of(video) for video in videos))
+        return {video['id']: metadata for video, metadata in zip(videos, results)}
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import os
+import random
+from typing import List, Optional
+
+import aiohttp
+
+from src.utils.quota import QUOTA_EXCEEDED_REASONS, get_quota_scheduler
+
+YOUTUBE_API_BASE_URL = os.environ.get('YOUTUBE_API_BASE_URL', 'https://www.googleapis.com/youtube/v3')
+MAX_IDS_PER_REQUEST = 50  # YouTube API's limitation
+
+# 403 is included because the API answers rate limiting with 403 rateLimitExceeded as well as 429
+RETRYABLE_STATUSES = {403, 429, 500, 502, 503, 504}
+
+
+class YouTubeAPIError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"YouTube Data API returned {status}: {message}")
+        self.status = status
+
+
+class VideosListFetcher:
+    """
+    Concurrent fetch engine for videos.list batches.
+
+    At most max_in_flight requests are outstanding at once across every caller sharing the fetcher, each request
+    is bounded by request_timeout seconds, and 403/429/5xx responses or timeouts are retried with full-jitter
+    exponential backoff. Every attempt, including retries, is charged to the quota scheduler, which also picks the
+    API key. base_url can point at a local stub server.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, api_key: str, credentials=None,
+                 max_in_flight: int = int(os.environ.get('YOUTUBE_API_MAX_IN_FLIGHT', 8)),
+                 request_timeout: float = float(os.environ.get('YOUTUBE_API_TIMEOUT', 30)),
+                 max_retries: int = 5, backoff_base: float = 1.0, backoff_cap: float = 32.0,
+                 base_url: str = YOUTUBE_API_BASE_URL):
+        self.session = session
+        self.scheduler = get_quota_scheduler()
+        self.scheduler.add_key(api_key)
+        self.credentials = credentials
+        self.request_timeout = request_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.base_url = base_url.rstrip('/')
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._credentials_lock = asyncio.Lock()
+
+    async def _auth_headers(self) -> dict:
+        if self.credentials is None:
+            return {}
+        async with self._credentials_lock:
+            if not self.credentials.valid:
+                from google.auth.transport.requests import Request
+                await asyncio.to_thread(self.credentials.refresh, Request())
+        return {'Authorization': f'Bearer {self.credentials.token}'}
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after and retry_after.isdigit():
+            return min(self.backoff_cap, float(retry_after))
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    async def get(self, endpoint: str, params: dict) -> dict:
+        """
+        Performs a GET on a Data API endpoint with bounded concurrency, timeout and retries.
+
+        Args:
+            endpoint (str): The resource path, e.g. 'videos'.
+            params (dict): Query parameters, the API key chosen by the quota scheduler is added automatically.
+
+        Returns:
+            dict: The decoded JSON response.
+        """
+        url = f"{self.base_url}/{endpoint}"
+        timeout = aiohttp.ClientTimeout(total=self.request_timeout)
+
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            async with self._semaphore:
+                try:
+                    headers = await self._auth_headers()
+                    api_key = self.scheduler.acquire(f'{endpoint}.list')
+                    request_params = {**params, 'key': api_key}
+                    async with self.session.get(url, params=request_params, headers=headers, timeout=timeout) as response:
+                        if response.status == 200:
+                            return await response.json()
+                        message = await response.text()
+                        if response.status == 403 and any(reason in message for reason in QUOTA_EXCEEDED_REASONS):
+                            # Retrying with this key is pointless until tomorrow, the next attempt rotates to another one
+                            self.scheduler.mark_exhausted(api_key)
+                        if response.status not in RETRYABLE_STATUSES or attempt == self.max_retries:
+                            raise YouTubeAPIError(response.status, message)
+                        retry_after = response.headers.get('Retry-After')
+                        logging.warning(f"{endpoint}.list returned {response.status}, retrying ({attempt + 1}/{self.max_retries})")
+                except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+                    if attempt == self.max_retries:
+                        raise
+                    logging.warning(f"{endpoint}.list failed with {type(e).__name__}, retrying ({attempt + 1}/{self.max_retries})")
+            # Sleep outside of the semaphore so that waiting requests do not hold an in-flight slot
+            await asyncio.sleep(self._backoff_delay(attempt, retry_after))
+
+    async def fetch_batch(self, id_batch: List[str], part: str = 'snippet') -> List[dict]:
+        """
+        Fetches a single videos.list batch of at most MAX_IDS_PER_REQUEST video IDs.
+        """
+        response = await self.get('videos', {'part': part, 'id': ','.join(id_batch), 'maxResults': MAX_IDS_PER_REQUEST})
+        return response.get('items', [])
+
+    async def fetch_batches(self, video_ids: List[str], part: str = 'snippet') -> List[List[dict]]:
+        """
+        Splits video_ids into batches and fetches all of them concurrently. A failed batch yields the exception in
+        place of its items so that callers can decide how to handle it.
+        """
+        batches = [video_ids[i:i + MAX_IDS_PER_REQUEST] for i in range(0, len(video_ids), MAX_IDS_PER_REQUEST)]
+        return await asyncio.gather(*(self.fetch_batch(batch, part) for batch in batches), return_exceptions=True)
@@ -0,0 +1,124 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import yt_dlp as ydlp
+from yt_dlp.extractor.common import InfoExtractor
+
+# Options that change with every download, they are applied to the long-lived instance instead of being part of its key
+PER_DOWNLOAD_OPTIONS = ('outtmpl', 'progress_hooks', 'postprocessor_hooks')
+
+_local = threading.local()
+
+
+def _options_key(ydl_opts: dict) -> str:
+    return json.dumps({key: value for key, value in ydl_opts.items() if key not in PER_DOWNLOAD_OPTIONS}, sort_keys=True, default=repr)
+
+
+class ReusableYoutubeDL:
+    """
+    A long-lived YoutubeDL instance for one option set, used by a single worker thread.
+
+    Building a YoutubeDL registers every extractor and sets up its HTTP session, which used to be repeated for each
+    URL and retry. The output template and hooks of each download are swapped in before it starts, the hooks
+    through dispatchers registered once at construction.
+    """
+
+    def __init__(self, ydl_opts: dict):
+        self._progress_hooks = []
+        self._postprocessor_hooks = []
+        static_opts = {key: value for key, value in ydl_opts.items() if key not in PER_DOWNLOAD_OPTIONS}
+        self.ydl = ydlp.YoutubeDL({
+            **static_opts,
+            'progress_hooks': [lambda status: [hook(status) for hook in self._progress_hooks]],
+            'postprocessor_hooks': [lambda status: [hook(status) for hook in self._postprocessor_hooks]],
+        })
+
+    @contextmanager
+    def _per_download(self, ydl_opts: dict):
+        outtmpl = ydl_opts.get('outtmpl')
+        if outtmpl:
+            self.ydl.params['outtmpl'].update(outtmpl if isinstance(outtmpl, dict) else {'default': outtmpl})
+        self._progress_hooks = ydl_opts.get('progress_hooks', [])
+        self._postprocessor_hooks = ydl_opts.get('postprocessor_hooks', [])
+        try:
+            yield
+        finally:
+            self._progress_hooks, self._postprocessor_hooks = [], []
+
+    def extract_info(self, url: str, ydl_opts: dict, download: bool = True, **kwargs) -> Optional[dict]:
+        with self._per_download(ydl_opts):
+            return self.ydl.extract_info(url, download=download, **kwargs)
+
+    def process_ie_result(self, info: dict, ydl_opts: dict, download: bool = True) -> Optional[dict]:
+        """
+        Downloads from an info dict extracted earlier, e.g. by the metadata pre-flight, without extracting it again.
+        """
+        with self._per_download(ydl_opts):
+            return self.ydl.process_ie_result(self.ydl.sanitize_info(info), download=download)
+
+    def prepare_filename(self, info: dict) -> str:
+        return self.ydl.prepare_filename(info)
+
+
+def get_youtube_dl(ydl_opts: dict) -> ReusableYoutubeDL:
+    """
+    Returns the calling thread's YoutubeDL for the option set of ydl_opts, creating it on first use.
+    """
+    instances = getattr(_local, 'instances', None)
+    if instances is None:
+        instances = _local.instances = {}
+    key = _options_key(ydl_opts)
+    if key not in instances:
+        instances[key] = ReusableYoutubeDL(ydl_opts)
+    return instances[key]
+
+
+def discard_youtube_dl(ydl_opts: dict):
+    """
+    Drops the calling thread's instance for the option set, e.g. after an unexpected error left it in an unknown state.
+    """
+    getattr(_local, 'instances', {}).pop(_options_key(ydl_opts), None)
+
+
+class _StubIE(InfoExtractor):
+    # Resolves stub:// URLs locally, so that the benchmark measures setup cost rather than the network
+    _VALID_URL = r'stub://(?P<id>.+)'
+
+    def _real_extract(self, url):
+        video_id = self._match_id(url)
+        return {'id': video_id, 'title': f'Video {video_id}', 'url': f'stub://media/{video_id}', 'ext': 'opus'}
+
+
+def benchmark_youtube_dl_reuse(n_urls: int = 200):
+    """
+    Compares the per-URL cost of constructing a YoutubeDL for each URL with reusing the thread's instance, extracting
+    from a local stub extractor.
+    """
+    ydl_opts = {'format': 'bestaudio/best', 'quiet': True, 'no_warnings': True}
+    urls = [f'stub://{i}' for i in range(n_urls)]
+
+    start = time.perf_counter()
+    for url in urls:
+        with ydlp.YoutubeDL({**ydl_opts, 'outtmpl': f'/tmp/{url[7:]}.%(ext)s'}) as ydl:
+            ydl.add_info_extractor(_StubIE())
+            ydl.extract_info(url, download=False, ie_key=_StubIE.ie_key())
+    per_url_before = (time.perf_counter() - start) / n_urls
+
+    discard_youtube_dl(ydl_opts)
+    start = time.perf_counter()
+    for url in urls:
+        youtube_dl = get_youtube_dl(ydl_opts)
+        if _StubIE.ie_key() not in youtube_dl.ydl._ies:
+            youtube_dl.ydl.add_info_extractor(_StubIE())
+        youtube_dl.extract_info(url, {**ydl_opts, 'outtmpl': f'/tmp/{url[7:]}.%(ext)s'}, download=False, ie_key=_StubIE.ie_key())
+    per_url_after = (time.perf_counter() - start) / n_urls
+
+    print(f"{n_urls} URLs: new YoutubeDL per URL {per_url_before * 1000:.2f} ms/URL, "
+          f"reused per thread {per_url_after * 1000:.2f} ms/URL ({per_url_before / per_url_after:.1f}x)")
+
+
+if __name__ == '__main__':
+    benchmark_youtube_dl_reuse()
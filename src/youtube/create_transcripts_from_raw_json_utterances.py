@@ -6,6 +6,7 @@ import random
 from functools import partial
 
 from src.utils.utils import timeit
+from src.utils.artifact_index import record_artifact
 from src.constants_and_keywords_to_filter import YOUTUBE_VIDEO_DIRECTORY
 
 
@@ -91,6 +92,7 @@ def process_transcript(file_path, log, sentence_count=7):
         with open(output_path, 'w') as output_file:
             for segment in all_segments:
                 output_file.write(segment + '\n')
+        record_artifact(output_path)
         if log:
             print(f"Saved {output_filename}")
     except Exception as e:
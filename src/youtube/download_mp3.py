@@ -1,23 +1,31 @@
 import asyncio
-import itertools
-import json
 import os
+import time
 import argparse
+from contextlib import nullcontext
+from functools import partial
 from typing import List, Optional
 from dotenv import load_dotenv
-import pandas as pd
-import yt_dlp as ydlp
 from yt_dlp import DownloadError
 import logging
 
 from src.utils.utils import root_directory
-from src.utils.download import get_channel_id, get_video_info
+from src.utils.artifact_index import ArtifactIndex, canonical_video_name
+from src.utils.artifact_reorganizer import reorganize_artifacts
+from src.utils.audio_store import AudioStore
+from src.utils.catalog import VideoCatalog
+from src.utils.filter_rules import FilterRules, DECISION_KEEP, get_filter_rules
+from src.utils.download import resolve_channel_handles
 from src.constants_and_keywords_to_filter import YOUTUBE_VIDEO_DIRECTORY
-from src.utils.utils import authenticate_service_account, move_remaining_mp3_to_their_subdirs, clean_fullwidth_characters, merge_directories, delete_mp3_if_text_or_json_exists, start_logging
+from src.utils.download_scheduler import DownloadProgress, DownloadScheduler
+from src.utils.transcode import TranscodePool
+from src.utils.ytdl_pool import get_youtube_dl, discard_youtube_dl
+from src.utils.download_errors import CircuitBreaker, DownloadFailed, ERROR_UNKNOWN, RETRY_POLICIES, backoff_delay, classify_download_error
+from src.utils.download_ledger import DownloadLedger
+from src.utils.video_metadata import VideoMetadataCache, MAX_AUDIO_DURATION_SECONDS, UNFINISHED_LIVE_STATUSES, skip_reason, select_audio_format
+from src.utils.utils import authenticate_service_account, delete_mp3_if_text_or_json_exists, start_logging
+from src.utils.dataset_repair import clean_fullwidth_characters, merge_directories
 
-from concurrent.futures import ThreadPoolExecutor
-
-executor = ThreadPoolExecutor(max_workers=os.cpu_count())
 api_key = os.environ.get('YOUTUBE_API_KEY')
 if not api_key:
     raise ValueError("No API key provided. Please provide an API key via command line argument or .env file.")
@@ -29,159 +37,198 @@ start_logging(f"download_mp3s")
 logging.getLogger('googleapiclient.discovery_cache').setLevel(logging.WARNING)
 
 
-def chunked_iterable(iterable, size):
-    """Splits an iterable into chunks of a specified size."""
-    iterator = iter(iterable)
-    while True:
-        chunk = list(itertools.islice(iterator, size))
-        if not chunk:
-            break
-        yield chunk
+SKIP_FILTERED_OUT = 'filtered out'
+SKIP_ALREADY_PROCESSED = 'already processed'
 
 
-def download_video(url, ydl_opts, retries=3):
-    while retries > 0:
-        with ydlp.YoutubeDL(ydl_opts) as ydl:
-            try:
-                ydl.download([url])
-                logging.info(f"Downloaded video: {url}")
-                break  # Exit the loop if download succeeds
-            except DownloadError:
-                logging.warning(f"Download error for {url}. Retrying... {retries} attempts left.")
-            except Exception as e:
-                logging.warning(f"Error downloading {url}: {e}")
-        retries -= 1  # Decrement the number of retries after an exception
+def audio_ydl_opts(outtmpl):
+    # Only the native bestaudio stream is fetched, transcoding to mp3 is a separate stage (see TranscodePool)
+    return {
+        'format': 'bestaudio/best',
+        'outtmpl': outtmpl,
+        # An interrupted download leaves its .part file under the same name, the next run continues it
+        'continuedl': True,
+    }
 
 
-async def download_audio_batch(video_infos: List[dict], ydl_opts: dict):
+def download_video(url, ydl_opts, metadata_cache: Optional[VideoMetadataCache] = None, circuit_breaker: Optional[CircuitBreaker] = None):
     """
-    Download a batch of videos in parallel using threads.
+    Downloads a video with yt-dlp, retrying according to the category of each error.
+
+    The first attempt downloads from the info dict of the metadata pre-flight if there is one, later attempts extract
+    the video again in case its media URLs expired. Retries wait a jittered exponential backoff, and every attempt
+    waits while the circuit breaker shared by the download pool is open.
+
+    Returns:
+        str: The path of the downloaded file.
+
+    Raises:
+        DownloadFailed: Once the retries of the last error's category are exhausted, right away for permanent errors.
     """
-    loop = asyncio.get_event_loop()
-    futures = [
-        loop.run_in_executor(executor, download_video, info['url'], ydl_opts)
-        for info in video_infos
-    ]
-    for future in futures:
+    preflight_info = metadata_cache.take_info(url) if metadata_cache else None
+    attempt = 0
+    while True:
+        if circuit_breaker:
+            circuit_breaker.wait()
+        # The worker thread's YoutubeDL is reused across URLs and retries instead of being built for every attempt
+        youtube_dl = get_youtube_dl(ydl_opts)
         try:
-            await future  # Use await to get the result of the future
+            if preflight_info:
+                info, preflight_info = youtube_dl.process_ie_result(preflight_info, ydl_opts, download=True), None
+            else:
+                info = youtube_dl.extract_info(url, ydl_opts, download=True)
+            logging.info(f"Downloaded video: {url}")
+            if circuit_breaker:
+                circuit_breaker.record(None)
+            requested_downloads = info.get('requested_downloads') or [{}]
+            return requested_downloads[0].get('filepath') or youtube_dl.prepare_filename(info)  # Exit the loop if download succeeds
         except Exception as e:
-            # Handle exceptions from within the thread
-            logging.error(f"An error occurred: {e}")
+            if not isinstance(e, DownloadError):
+                # Unexpected errors may leave the instance in an unknown state
+                discard_youtube_dl(ydl_opts)
+            category = classify_download_error(e)
+            if circuit_breaker:
+                circuit_breaker.record(category)
+            policy = RETRY_POLICIES[category]
+            if attempt >= policy.retries:
+                logging.warning(f"Giving up on {url} after {attempt + 1} attempts, {category} error: {e}")
+                raise DownloadFailed(category, str(e)) from e
+            delay = backoff_delay(attempt, policy)
+            logging.warning(f"{category.capitalize()} error downloading {url}: {e}. Retrying in {delay:.0f}s, {policy.retries - attempt} attempts left.")
+            time.sleep(delay)
+        preflight_info = None
+        attempt += 1
 
 
-def filter_videos_in_dataframe(video_info_list, youtube_videos_df):
-    # Normalize titles in the dataframe
-    youtube_videos_df['title'] = youtube_videos_df['title'].str.replace(' +', ' ', regex=True).str.replace('"', '', regex=False)
+def filter_videos_in_catalog(video_info_list, catalog: VideoCatalog):
+    # Return the catalog rows of the videos that are in the catalog, looked up by video ID
+    return [catalog.get_by_video_id(video['id']) for video in video_info_list if catalog.contains_video_id(video['id'])]
 
-    # Extract titles from the video info list
-    titles = [video['title'] for video in video_info_list]
 
-    # Create a mask for videos that are in the DataFrame
-    mask = youtube_videos_df['title'].isin(titles)
+def filter_rules_condition(filter_rules: FilterRules) -> str:
+    # Skips decided by the filter rules hold as long as the rule file is unchanged
+    return f"filter_rules={filter_rules.version}"
 
-    # Get the titles present in the DataFrame
-    titles_in_df = youtube_videos_df[mask]
 
-    # Filter and return videos that are in DataFrame
-    return titles_in_df
+# Skips of videos that are too long hold as long as the duration limit is unchanged
+MAX_DURATION_CONDITION = f"max_duration={MAX_AUDIO_DURATION_SECONDS}"
 
 
-async def video_valid_for_processing(channel_name, video_title, dir_path):
+async def video_valid_for_processing(channel_name, video_dict: dict, artifact_index: ArtifactIndex, filter_rules: FilterRules) -> Optional[str]:
+    # Returns None if the video is to be downloaded, otherwise why not: SKIP_FILTERED_OUT, SKIP_ALREADY_PROCESSED or an error
     try:
-        normalized_video_title = video_title.replace('/', '_')
-        titles_to_avoid = ['livestream', 'live stream', 'live']
-        for title in titles_to_avoid:
-            if title in normalized_video_title.lower():
-                return False
-
-        # Function to check for the title's existence in files
-        def title_exists_in_files(directory, suffix):
-            for filename in os.listdir(directory):
-                if normalized_video_title in filename and filename.endswith(suffix):
-                    return True
-            return False
-
-        # Recursively check in dir_path and its subdirectories
-        for root, dirs, files in os.walk(dir_path):
-            if (
-                    title_exists_in_files(root, ".mp3") or
-                    title_exists_in_files(root, "_diarized_content.json") or
-                    title_exists_in_files(root, "_diarized_content_processed_diarized.txt") or
-                    title_exists_in_files(root, "_content_processed_diarized.txt")
-            ):
-                # logging.info(f"video_valid_for_processing: {video_title} is already processed")
-                return False
+        video_title = video_dict['title']
+        # Titles not to download, e.g. livestreams, are skip_download rules of the filter rule file
+        decision, rule_id = filter_rules.decide(video_dict.get('channel_name'), video_title.replace('/', '_'))
+        if decision != DECISION_KEEP:
+            return SKIP_FILTERED_OUT
+
+        # Any of the .mp3, _diarized_content.json or _processed_diarized.txt files existing means it is already processed
+        if artifact_index.is_processed(channel_name, video_title, video_dict.get('published_date', ''), video_dict.get('video_id')):
+            # logging.info(f"video_valid_for_processing: {video_title} is already processed")
+            return SKIP_ALREADY_PROCESSED
         logging.info(f"[{channel_name}] video_valid_for_processing: [{video_title}] is not processed yet, adding to the list!")
-        return True
+        return None
     except Exception as e:
         logging.warning(f"Exception in video_valid_for_processing: {e}")
-        return False
-
-
-async def prepare_download_info(video_info, dir_path, video_title):
-    strlen = len("yyyy-mm-dd")
-    published_at = video_info['publishedAt'].replace(':', '-').replace('.', '-')[:strlen]
-    video_title = f"{published_at}_{video_title}"
-
-    # Create a specific directory for this video if it doesn't exist
-    video_dir_path = os.path.join(dir_path, video_title)
-    if not os.path.exists(video_dir_path):
-        os.makedirs(video_dir_path)
-
-    audio_file_path = os.path.join(video_dir_path, f'{video_title}.mp3')
-    ydl_opts = {
-        'format': 'bestaudio/best',
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '192',
-        }],
-        'outtmpl': f'{video_dir_path}/{video_title}.%(ext)s',
-    }
-    return ydl_opts, audio_file_path
-
-
-async def process_video_batches(channel_name, video_info_list, dir_path, youtube_videos_df, batch_size=50):
-    video_batches = list(chunked_iterable(video_info_list, batch_size))
-    # TODO 2023-10-31: fix somehow the addition of spaces before colons : e.g. for DVT and for Defi panel
-    #  The different pipes somehow. Check the match method in utils.py
-    ydl_opts = {
-        'format': 'bestaudio/best',
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '192',
-        }],
-        'outtmpl': f'{dir_path}/%(title)s.%(ext)s',
-    }
-
-    tasks = []
-    for batch_info in video_batches:
-        filtered_videos = filter_videos_in_dataframe(batch_info, youtube_videos_df)
-        valid_videos = []
-        for index, row in filtered_videos.iterrows():
-            video_dict = row.to_dict()
-            is_video_Valid = await video_valid_for_processing(channel_name, video_dict['title'], dir_path)
-            if is_video_Valid:
-                valid_videos.append(video_dict)
-        if len(valid_videos) > 1:
-            logging.info(f"[{channel_name}] valid videos: {valid_videos}")
-
-        if valid_videos:
-            # Since download_audio_batch is now an async function, we directly add it to the task list
-            task = asyncio.create_task(download_audio_batch(valid_videos, ydl_opts))
-            tasks.append(task)
-
-    # Now we run the download tasks concurrently.
-    await asyncio.gather(*tasks)
+        return f"error: {e}"
+
+
+def video_outtmpl(dir_path: str, video_dict: dict) -> str:
+    # Downloads land in their final '{date}_{title}/{date}_{title}.ext' location, the path is escaped as a yt-dlp template.
+    # yt-dlp expands environment variables in the template and has no escape for '$', so each '$' becomes a template
+    # field that is never set, whose default is a literal '$'
+    name = canonical_video_name(video_dict['title'], video_dict.get('published_date', ''))
+    return os.path.join(dir_path, name, name).replace('%', '%%').replace('$', '%(_literal_dollar|$)s') + '.%(ext)s'
+
+
+async def download_and_transcode(download: asyncio.Future, transcode_pool: Optional[TranscodePool], progress: Optional[DownloadProgress] = None) -> Optional[str]:
+    # Stage one fetches the native audio through the download scheduler, stage two transcodes it in the process pool
+    audio_file_path = await download
+    if audio_file_path and transcode_pool:
+        # If ffmpeg fails the native audio is kept, diarization accepts it as well
+        audio_file_path = await transcode_pool.transcode(audio_file_path, progress) or audio_file_path
+    return audio_file_path
+
+
+async def process_video_batches(channel_name, video_info_list, dir_path, catalog: VideoCatalog, artifact_index: ArtifactIndex, filter_rules: FilterRules,
+                                scheduler: DownloadScheduler, transcode_pool: Optional[TranscodePool], metadata_cache: VideoMetadataCache, ledger: DownloadLedger,
+                                audio_store: AudioStore):
+    # The catalog rows without a download job, then the channel's jobs the ledger holds from earlier runs:
+    # interrupted ones, and failed or postponed ones whose backoff elapsed
+    new_video_ids = {video['id'] for video in video_info_list}
+    video_info_list = video_info_list + [{'id': video_id} for video_id in ledger.due_video_ids(channel_name) if video_id not in new_video_ids]
+    candidates = []
+    for video_dict in filter_videos_in_catalog(video_info_list, catalog):
+        if not ledger.is_due(video_dict['video_id']):
+            continue
+        reason = await video_valid_for_processing(channel_name, video_dict, artifact_index, filter_rules)
+        if reason is None:
+            candidates.append(video_dict)
+        elif video_dict['video_id'] not in new_video_ids:
+            # Filtered out videos are looked at again once the rules change, errors are retried on the next run
+            if reason == SKIP_FILTERED_OUT:
+                ledger.skip(video_dict['video_id'], reason, filter_rules_condition(filter_rules))
+            elif reason == SKIP_ALREADY_PROCESSED:
+                ledger.skip(video_dict['video_id'], reason)
+
+    videos, downloads = [], []
+    # The pre-flight runs ahead of the downloads one queue's worth at a time, so that the info dicts it keeps in
+    # memory for the downloads are bounded by the scheduler's back-pressure
+    for start in range(0, len(candidates), scheduler.max_pending_per_channel):
+        batch = candidates[start:start + scheduler.max_pending_per_channel]
+        metadata_per_video = await metadata_cache.preflight([{'id': video_dict['video_id'], 'url': video_dict['url']} for video_dict in batch])
+        for video_dict in batch:
+            video_id = video_dict['video_id']
+            ledger.queue(video_id, channel_name, video_dict['url'], video_dict['title'])
+            metadata = metadata_per_video[video_id]
+            reason = skip_reason(metadata) if metadata else None
+            if metadata is None:
+                failure = metadata_cache.failures.pop(video_id, None) or DownloadFailed(ERROR_UNKNOWN, 'metadata extraction failed')
+                ledger.fail(video_id, str(failure), permanent=failure.permanent)
+            elif reason:
+                metadata_cache.take_info(video_dict['url'])
+                logging.info(f"[{channel_name}] skipping [{video_dict['title']}]: {reason}")
+                if metadata.get('live_status') in UNFINISHED_LIVE_STATUSES:
+                    # Looked at again once the recording is likely available
+                    ledger.postpone(video_id, reason, metadata_cache.live_ttl)
+                else:
+                    # Too long, looked at again if the duration limit is raised
+                    ledger.skip(video_id, reason, MAX_DURATION_CONDITION)
+            else:
+                ydl_opts = {**audio_ydl_opts(video_outtmpl(dir_path, video_dict)), 'format': select_audio_format(metadata), 'progress_hooks': [ledger.progress_hook(video_id)]}
+                # Waits while the global download queue is full, which holds back the pre-flight of further videos
+                download = await scheduler.submit(channel_name, video_dict['url'], ydl_opts)
+                videos.append(video_dict)
+                downloads.append(asyncio.create_task(download_and_transcode(download, transcode_pool, scheduler.progress)))
+    if downloads:
+        logging.info(f"[{channel_name}] queued {len(downloads)} videos for download")
+
+    # Record the outcome of each download in the ledger, and the finished audio files in the artifact index
+    for video_dict, result in zip(videos, await asyncio.gather(*downloads, return_exceptions=True)):
+        if isinstance(result, DownloadFailed):
+            # Permanent failures, e.g. removed or private videos, are never attempted again
+            ledger.fail(video_dict['video_id'], str(result), permanent=result.permanent)
+        elif isinstance(result, BaseException) or not result:
+            ledger.fail(video_dict['video_id'], str(result) or 'download failed')
+        else:
+            ledger.finish(video_dict['video_id'], result)
+            artifact_index.add(channel_name, video_dict['title'], 'mp3', video_dict.get('published_date', ''), video_dict['video_id'], result)
+            try:
+                # The audio moves into the content-addressed store, the per-title file becomes a link to it
+                _, duplicate_of = await asyncio.to_thread(audio_store.add, result)
+                if duplicate_of:
+                    logging.info(f"[{channel_name}] [{video_dict['title']}] has the same audio as [{duplicate_of}], it will not be diarized again")
+            except OSError as e:
+                logging.warning(f"Could not add {result} to the audio store: {e}")
 
 
-async def process_video_batches_async(channel_id, channel_name, credentials, youtube_videos_df):
+async def process_video_batches_async(channel_name, channel_title, catalog: VideoCatalog, artifact_index: ArtifactIndex, filter_rules: FilterRules, scheduler: DownloadScheduler, transcode_pool: Optional[TranscodePool], metadata_cache: VideoMetadataCache, ledger: DownloadLedger, audio_store: AudioStore):
     logging.info(f"Processing channel: {channel_name}")
     dir_path = YOUTUBE_VIDEO_DIRECTORY
-    # Get video information from the channel
-    video_info_list = get_video_info(credentials, api_key, channel_id)
+    # The channel's catalog rows that no download job was created for yet, whenever they reached the catalog, e.g.
+    # through a later fetch or a re-filter. The artifact index then tells which of them are already downloaded
+    video_info_list = [{'id': row['video_id']} for row in catalog.rows_for_channel(channel_title) if row.get('video_id') and ledger.get(row['video_id']) is None]
 
     # Create a 'data' directory if it does not exist
     if not os.path.exists(dir_path):
@@ -192,10 +239,11 @@ async def process_video_batches_async(channel_id, channel_name, credentials, you
     if not os.path.exists(dir_path):
         os.makedirs(dir_path)
 
-    await process_video_batches(channel_name, video_info_list, dir_path, youtube_videos_df)
+    await process_video_batches(channel_name, video_info_list, dir_path, catalog, artifact_index, filter_rules, scheduler, transcode_pool, metadata_cache, ledger, audio_store)
 
 
-async def run(api_key: str, yt_channels: Optional[List[str]] = None, yt_playlists: Optional[List[str]] = None):
+async def run(api_key: str, yt_channels: Optional[List[str]] = None, yt_playlists: Optional[List[str]] = None, transcode: bool = os.environ.get('TRANSCODE_AUDIO', 'True').lower() == 'true',
+              repair: bool = False):
     """
     Run function that takes a YouTube Data API key and a list of YouTube channel names, fetches video transcripts,
     and saves them as .txt files in a data directory.
@@ -204,8 +252,13 @@ async def run(api_key: str, yt_channels: Optional[List[str]] = None, yt_playlist
         yt_playlists:
         api_key (str): Your YouTube Data API key.
         yt_channels (List[str]): A list of YouTube channel names.
+        transcode (bool): Transcode the downloaded audio to mp3, otherwise keep the native opus/m4a audio, which
+            diarization accepts as well.
+        repair (bool): Also repair the names and locations of files written by older versions, which did not write
+            downloads under their canonical name, before and after downloading.
     """
-    clean_mp3s()
+    if repair:
+        clean_mp3s()
     service_account_file = os.environ.get('SERVICE_ACCOUNT_FILE')
     credentials = None
 
@@ -215,29 +268,36 @@ async def run(api_key: str, yt_channels: Optional[List[str]] = None, yt_playlist
     else:
         logging.info("No service account file found. Proceeding with public channels or playlists.")
 
-    # Create a dictionary with channel IDs as keys and channel names as values
-    # Define the path for storing the mapping between channel names and their IDs
-    channel_mapping_filepath = f"{root_directory()}/datasets/evaluation_data/channel_handle_to_id_mapping.json"
-
-    # Load existing mappings if the file exists, or initialize an empty dictionary
-    channel_name_to_id = {}  # Initialize regardless
-    if os.path.exists(channel_mapping_filepath):
-        with open(channel_mapping_filepath, 'r', encoding='utf-8') as file:
-            channel_name_to_id = json.load(file)
-
-    yt_id_name = {get_channel_id(credentials=credentials, api_key=api_key, channel_name=name, channel_name_to_id=channel_name_to_id): name for name in yt_channels}
+    # Channel title per handle, which the channel's catalog rows carry, shared with the metadata stage through the channel mapping
+    channels = resolve_channel_handles(credentials, api_key, yt_channels)
 
     videos_path = f"{root_directory()}/datasets/evaluation_data/youtube_videos.csv"
-    youtube_videos_df = pd.read_csv(videos_path)
-
-    # Iterate through the dictionary of channel IDs and channel names
-    await asyncio.gather(*(process_video_batches_async(channel_id, channel_name, credentials, youtube_videos_df)
-                           for channel_id, channel_name in yt_id_name.items()))
+    catalog = VideoCatalog.load(videos_path)
+
+    # Built from the tree on first use, then kept up to date by the download, diarization and formatting stages
+    artifact_index = ArtifactIndex.load(rebuild=os.environ.get('REBUILD_ARTIFACT_INDEX', 'False').lower() == 'true')
+
+    filter_rules = get_filter_rules()
+    # Live status, duration and audio formats of each video, extracted once and reused across retries and runs
+    # Shared by the metadata pre-flight and the download workers, pauses both while YouTube throttles the pool
+    circuit_breaker = CircuitBreaker()
+    metadata_cache = VideoMetadataCache.load(circuit_breaker=circuit_breaker)
+    # State of every download job, the work left over by earlier runs is scheduled from it
+    ledger = DownloadLedger.load(skip_conditions=[filter_rules_condition(filter_rules), MAX_DURATION_CONDITION])
+    # Each distinct audio stream is stored once, duplicate downloads and cross-posts are links to it
+    audio_store = AudioStore.load()
+
+    # Every channel is listed concurrently and feeds one download queue, the downloaded audio is transcoded in a process pool
+    with TranscodePool() if transcode else nullcontext() as transcode_pool:
+        async with DownloadScheduler(partial(download_video, metadata_cache=metadata_cache, circuit_breaker=circuit_breaker)) as scheduler:
+            await asyncio.gather(*(process_video_batches_async(channel_handle, channel['channel_name'], catalog, artifact_index, filter_rules,
+                                                               scheduler, transcode_pool, metadata_cache, ledger, audio_store)
+                                   for channel_handle, channel in channels.items()))
 
     # Iterate through the dictionary of channel IDs and channel names
 
     # if yt_playlists:
-    #     await asyncio.gather(*(process_video_batches_async(channel_id, channel_name, credentials, youtube_videos_df)
+    #     await asyncio.gather(*(process_video_batches_async(channel_id, channel_name, credentials, catalog)
     #                            for channel_id, channel_name in yt_id_name.items()))
     #     for playlist_id in yt_playlists:
     #         playlist_title = get_playlist_title(credentials, api_key, playlist_id)
@@ -253,17 +313,20 @@ async def run(api_key: str, yt_channels: Optional[List[str]] = None, yt_playlist
     #         if not os.path.exists(dir_path):
     #             os.makedirs(dir_path)
     #
-    #         await process_video_batches(channel_name, video_info_list, dir_path, youtube_videos_df)
+    #         await process_video_batches(channel_name, video_info_list, dir_path, catalog)
 
-    # clean up because downloaded file names have full-width characters instead of ASCII
-    clean_mp3s()
+    if repair:
+        clean_mp3s()
 
 
 def clean_mp3s():
+    # Repairs the dataset tree: full-width characters in names, audio files outside of their '{date}_{title}/'
+    # directory, and audio files whose transcript already exists. Downloads are named canonically, see video_outtmpl
     directory = f"{root_directory()}/datasets/evaluation_data/diarized_youtube_content_2023-10-06"
     delete_mp3_if_text_or_json_exists(directory)
+    AudioStore.load().prune()
     clean_fullwidth_characters(directory)
-    move_remaining_mp3_to_their_subdirs()
+    reorganize_artifacts(directory)
     merge_directories(directory)
 
 
@@ -278,6 +341,8 @@ def main():
     parser.add_argument('--api_key', type=str, help='YouTube Data API key')  # to be moved back to main() to use CLI arguments
     parser.add_argument('--channels', nargs='+', type=str, help='YouTube channel names or IDs')
     parser.add_argument('--playlists', nargs='+', type=str, help='YouTube playlist IDs')
+    parser.add_argument('--no-transcode', action='store_true', help='Keep the native opus/m4a audio instead of transcoding it to mp3')
+    parser.add_argument('--repair', action='store_true', help='Also walk the dataset tree to fix the names and locations of files from older downloads')
 
     args = parser.parse_args()
 
@@ -294,7 +359,8 @@ def main():
         raise ValueError(
             "No channels or playlists provided. Please provide channel names, IDs, or playlist IDs via command line argument or .env file.")
 
-    asyncio.run(run(api_key, yt_channels, yt_playlists))
+    transcode = not args.no_transcode and os.environ.get('TRANSCODE_AUDIO', 'True').lower() == 'true'
+    asyncio.run(run(api_key, yt_channels, yt_playlists, transcode=transcode, repair=args.repair))
 
 
 if __name__ == '__main__':
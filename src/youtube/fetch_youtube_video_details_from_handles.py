@@ -1,57 +1,47 @@
+import argparse
 import os
 import traceback
 from typing import List, Optional
-import json
 
 import aiohttp
 import pandas as pd
-from googleapiclient.discovery import build
 from dotenv import load_dotenv
 from google.oauth2.service_account import Credentials as ServiceAccountCredentials
 from datetime import datetime
 import logging
-import csv
 import asyncio
 from aiohttp import ClientSession
 
-from src.constants_and_keywords_to_filter import KEYWORDS_TO_INCLUDE, KEYWORDS_TO_EXCLUDE, AUTHORS, FIRMS, MAPPING_FILE_PATH
-from src.utils.utils import root_directory, authenticate_service_account
-from src.utils.download import get_videos_from_playlist, get_channel_id, get_channel_name
-from src.constants_and_keywords_to_filter import YOUTUBE_CHANNELS_FILE, YOUTUBE_VIDEOS_CSV_FILE_PATH
+from src.utils.utils import authenticate_service_account
+from src.utils.download import get_videos_from_playlist, resolve_channel_handles, youtube_client
+from src.utils.quota import execute_request, get_quota_scheduler
+from src.utils.youtube_fetch import VideosListFetcher
+from src.utils.sync_state import ChannelSyncState, split_new_playlist_items, newest_playlist_item
+from src.utils.filter_rules import FilterRules, DECISION_REMOVE, get_filter_rules
+from src.utils.title_filter import FilterDiff, refilter_catalog, format_filter_diff
+from src.utils.catalog import VideoCatalog, CatalogWriter, CATALOG_HEADERS, migrate_catalog_schema
+from src.constants_and_keywords_to_filter import YOUTUBE_CHANNELS_FILE, YOUTUBE_VIDEOS_CSV_FILE_PATH, CHANNEL_SYNC_STATE_FILE_PATH, FILTERED_AWAY_CSV_FILE_PATH
 
 # Load environment variables from the .env file
 load_dotenv()
 
 
-async def get_multiple_video_details(channel_name, youtube, video_ids, keywords, keywords_to_exclude, PASSTHROUGH):
-    MAX_IDS_PER_REQUEST = 50  # YouTube API's limitation
+async def get_multiple_video_details(channel_name, fetcher: VideosListFetcher, catalog: VideoCatalog, video_ids, filter_rules: FilterRules):
     logging.info(f"[{channel_name}] Fetching video details for {len(video_ids)} videos...")
 
-    # This function will handle the request and processing of each batch of video IDs
-    async def process_id_batch(id_batch):
+    # This function will handle the processing of each batch of video details
+    def process_id_batch(items):
         try:
-            id_list = ','.join(id_batch)
-
-            video_response = youtube.videos().list(
-                part="snippet",
-                id=id_list  # Pass a batch of video IDs here
-            ).execute()
-
-            items = video_response.get('items', [])
-
-            youtube_videos_df = pd.read_csv(YOUTUBE_VIDEOS_CSV_FILE_PATH, encoding='utf-8')
-            youtube_videos_df['title'] = youtube_videos_df['title'].str.replace(' +', ' ', regex=True)
-
             batch_video_details = []
 
             for item in items:
                 video_info_item = item['snippet']
                 video_title = video_info_item['title']
 
-                video_row = youtube_videos_df[youtube_videos_df['title'] == video_title]
+                already_in_catalog = catalog.contains_video_id(item['id'])
 
-                def append_video_details(video_row, video_info_item, video_title, item):
-                    if not video_row.empty:
+                def append_video_details(already_in_catalog, video_info_item, video_title, item, decision, rule_id):
+                    if already_in_catalog:
                         # print(f"Video {video_title} already exists in the CSV file. Skipping...")
                         return
 
@@ -63,126 +53,142 @@ async def get_multiple_video_details(channel_name, youtube, video_ids, keywords,
                         'channel_name': video_info_item['channelTitle'],
                         'published_date': parsed_published_at.strftime("%Y-%m-%d"),
                         'url': f'https://www.youtube.com/watch?v={item["id"]}',
+                        'video_id': item['id'],
+                        'decision': decision,
+                        'rule_id': rule_id,
                     }
 
-                if video_info_item['channelTitle'] in PASSTHROUGH:
-                    video_detail = append_video_details(video_row, video_info_item, video_title, item)
-                    if video_detail:
-                        batch_video_details.append(video_detail)
-                elif (not keywords or any(keyword.lower() in video_title.lower() for keyword in keywords)) \
-                        and not any(keyword.lower() in video_title.lower() for keyword in keywords_to_exclude):
-                    video_detail = append_video_details(video_row, video_info_item, video_title, item)
-                    if video_detail:
-                        batch_video_details.append(video_detail)
+                # Evaluated once at ingest, the decision is stored with the video so that filtering does not redo it.
+                # Removed videos are returned as well, they are saved to the filtered-away store
+                decision, rule_id = filter_rules.decide(video_info_item['channelTitle'], video_title)
+                video_detail = append_video_details(already_in_catalog, video_info_item, video_title, item, decision, rule_id)
+                if video_detail:
+                    batch_video_details.append(video_detail)
 
             return batch_video_details
 
         except Exception as e:
-            logging.error(f"Error occurred while fetching video details. Error: {e}")
+            logging.error(f"Error occurred while processing video details. Error: {e}")
             traceback.print_exc()
-            return []
+            return None
 
-    # Now we create batches of video IDs and collect the details
+    # Now we fetch all batches of video IDs concurrently and collect the details, and the number of failed batches
     all_video_details = []
-    for i in range(0, len(video_ids), MAX_IDS_PER_REQUEST):
-        batch = video_ids[i:i + MAX_IDS_PER_REQUEST]
-        batch_details = await process_id_batch(batch)  # async function to process each batch
-        all_video_details.extend(batch_details)
-
-    return all_video_details
-
-
-async def get_video_info(session, credentials: ServiceAccountCredentials, api_key: str, channel_id: str, channel_name: str, PASSTHROUGH, max_results: int = 50) -> List[dict]:
+    failed_batches = 0
+    for batch_items in await fetcher.fetch_batches(video_ids):
+        if isinstance(batch_items, Exception):
+            logging.error(f"[{channel_name}] Error occurred while fetching video details. Error: {batch_items}")
+            failed_batches += 1
+            continue
+        batch_video_details = process_id_batch(batch_items)
+        if batch_video_details is None:
+            failed_batches += 1
+            continue
+        all_video_details.extend(batch_video_details)
+
+    return all_video_details, failed_batches
+
+
+async def get_video_info(fetcher: VideosListFetcher, catalog: VideoCatalog, credentials: ServiceAccountCredentials, api_key: str, channel_id: str, channel_name: str, filter_rules: FilterRules, max_results: int = 50, sync_state: Optional[ChannelSyncState] = None, uploads_playlist_id: Optional[str] = None) -> List[dict]:
     """
     Retrieves video information (URL, ID, title, and published date) from a YouTube channel using the YouTube Data API.
 
     Args:
         api_key (str): Your YouTube Data API key.
         channel_id (str): The YouTube channel ID.
+        filter_rules (FilterRules): The title filtering rules, each video is returned with its decision and rule_id.
         max_results (int, optional): Maximum number of results to retrieve. Defaults to 50.
+        sync_state (Optional[ChannelSyncState]): If provided, paging stops at the channel's high-water mark and the
+            newest listed upload is staged as the new mark.
+        uploads_playlist_id (Optional[str]): The channel's "Uploads" playlist ID if already known from the channel mapping.
 
     Returns:
         list: A list of dictionaries containing video URL, ID, title, and published date from the channel.
     """
-    # Initialize the YouTube API client
-    youtube = build('youtube', 'v3', credentials=credentials, developerKey=api_key)
-
     # Get the "Uploads" playlist ID
-    channel_request = youtube.channels().list(
-        part="contentDetails",
-        id=channel_id,
-        fields="items/contentDetails/relatedPlaylists/uploads"
-    )
-    channel_response = channel_request.execute()
-    uploads_playlist_id = channel_response["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
-
-    # Fetch videos from the "Uploads" playlist
-    video_info = []
+    if not uploads_playlist_id:
+        channel_response = await asyncio.to_thread(execute_request, 'channels.list', lambda key: youtube_client(credentials, key).channels().list(
+            part="contentDetails",
+            id=channel_id,
+            fields="items/contentDetails/relatedPlaylists/uploads"
+        ), api_key)
+        uploads_playlist_id = channel_response["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
+
+    # Fetch videos from the "Uploads" playlist. Paging is sequential because each page needs the previous token,
+    # but the videos.list details of a page are fetched in the background while the next page is requested.
+    detail_tasks = []
+    new_items = []
     next_page_token = None
+    high_water_mark = sync_state.high_water_mark(channel_id) if sync_state else None
 
     while True:
-        playlist_request = youtube.playlistItems().list(
-            part="snippet",
-            playlistId=uploads_playlist_id,
-            maxResults=max_results,
-            pageToken=next_page_token,
-        )
+        page_token = next_page_token
         try:
-            playlist_response = playlist_request.execute()
+            playlist_response = await asyncio.to_thread(execute_request, 'playlistItems.list', lambda key: youtube_client(credentials, key).playlistItems().list(
+                part="snippet",
+                playlistId=uploads_playlist_id,
+                maxResults=max_results,
+                pageToken=page_token,
+            ), api_key)
         except Exception as e:
             logging.error(f"Error occurred while fetching videos from the channel. Error: {e}")
-            return video_info
-        video_ids = [item["snippet"]["resourceId"]["videoId"] for item in playlist_response.get('items', [])]
-        video_details = await get_multiple_video_details(channel_name, youtube, video_ids, KEYWORDS_TO_INCLUDE, KEYWORDS_TO_EXCLUDE, PASSTHROUGH)
-
-        video_info.extend([video for video in video_details if video])  # Extend the list instead of overwriting it
+            # Keep the previous high-water mark, the unseen pages must be listed again on the next run
+            sync_state = None
+            break
+        page_items, reached_known_item = split_new_playlist_items(playlist_response.get('items', []), high_water_mark)
+        new_items.extend(page_items)
+        video_ids = [item["snippet"]["resourceId"]["videoId"] for item in page_items]
+        if video_ids:
+            detail_tasks.append(asyncio.create_task(
+                get_multiple_video_details(channel_name, fetcher, catalog, video_ids, filter_rules)))
 
         next_page_token = playlist_response.get('nextPageToken')
 
-        if not next_page_token:
+        if not next_page_token or reached_known_item:
             break
 
-    return video_info
-
-
-def save_video_info_to_csv(video_info_list, csv_file_path, existing_video_names, headers):
-    # Remove duplicates based on video titles
-    video_info_list = [
-        video_info for video_info in video_info_list
-        if video_info['title'] not in existing_video_names
-    ]
-
-    # Read existing CSV into a DataFrame, or create a new one if the file doesn't exist
-    try:
-        existing_df = pd.read_csv(csv_file_path)
-    except FileNotFoundError:
-        existing_df = pd.DataFrame(columns=headers)
-
-    # Filter out existing video names
-    new_videos = [video for video in video_info_list if video['title'] not in existing_video_names]
+    video_info = []
+    failed_batches = 0
+    for video_details, failed in await asyncio.gather(*detail_tasks):
+        video_info.extend([video for video in video_details if video])  # Extend the list instead of overwriting it
+        failed_batches += failed
 
-    # Convert new video info list to DataFrame
-    new_df = pd.DataFrame(new_videos, columns=headers)
+    if failed_batches:
+        # Keep the previous high-water mark, the videos of the failed batches must be listed again on the next run
+        logging.warning(f"[{channel_name}] {failed_batches} videos.list batches failed, the channel will be listed again from its previous sync.")
+    elif sync_state:
+        logging.info(f"[{channel_name}] {len(new_items)} uploads since the last sync.")
+        sync_state.stage(channel_id, newest_playlist_item(new_items))
 
-    # Concatenate new data with existing data
-    combined_df = pd.concat([existing_df, new_df], ignore_index=True)
+    return video_info
 
-    # Write the combined DataFrame to CSV
-    combined_df.to_csv(csv_file_path, index=False, quoting=csv.QUOTE_MINIMAL)
 
-    # Log the added videos
-    #for video in new_videos:
-    #    logging.info(f"Added: {video}")
+def save_video_info_to_csv(video_info_list, catalog_writer: CatalogWriter, filtered_away_writer: CatalogWriter):
+    # Only rows whose video IDs are not in the catalog yet are appended, the existing rows are never rewritten.
+    # Videos the rules remove go to the filtered-away store with their decision and rule_id, so that a re-filter
+    # can move them back into the catalog once the rules change
+    removed = [video_info for video_info in video_info_list if video_info.get('decision') == DECISION_REMOVE]
+    added_videos = catalog_writer.add_rows([video_info for video_info in video_info_list if video_info.get('decision') != DECISION_REMOVE])
+    filtered_away_writer.add_rows(removed)
+    # Make the rows durable once per channel or playlist, in addition to the writers' own batched flushes
+    catalog_writer.flush()
+    filtered_away_writer.flush()
+    return added_videos
 
 
-async def fetch_and_save_channel_videos_async(session, channel_id, channel_name, credentials, api_key, csv_file_path, existing_video_names, headers, PASSTHROUGH):
-    video_info_list = await get_video_info(session, credentials, api_key, channel_id, channel_name, PASSTHROUGH)
+async def fetch_and_save_channel_videos_async(fetcher, channel, credentials, api_key, catalog_writer: CatalogWriter, filtered_away_writer: CatalogWriter, filter_rules: FilterRules, sync_state: ChannelSyncState):
+    channel_id, channel_name = channel['channel_id'], channel['channel_name']
+    video_info_list = await get_video_info(fetcher, catalog_writer.catalog, credentials, api_key, channel_id, channel_name, filter_rules,
+                                           sync_state=sync_state, uploads_playlist_id=channel['uploads_playlist_id'])
 
-    save_video_info_to_csv(video_info_list, csv_file_path, existing_video_names, headers)
-    logging.info(f"[{channel_name}] Saved {len(video_info_list)} videos to CSV file {csv_file_path}.")
+    added_videos = save_video_info_to_csv(video_info_list, catalog_writer, filtered_away_writer)
+    # Only advance the high-water mark once the channel's videos are on disk
+    sync_state.commit(channel_id)
+    logging.info(f"[{channel_name}] Saved {added_videos} videos to CSV file {catalog_writer.csv_file_path}.")
+    return added_videos
 
 
-async def fetch_youtube_videos(api_key, yt_channels, yt_playlists, keywords, keywords_to_exclude, PASSTHROUGH, fetch_videos):
+async def fetch_youtube_videos(api_key, yt_channels, yt_playlists, filter_rules: FilterRules, fetch_videos, full_resync=False):
     """
     Fetches YouTube video information from specified channels and playlists, and optionally filters them based on keywords.
 
@@ -190,12 +196,9 @@ async def fetch_youtube_videos(api_key, yt_channels, yt_playlists, keywords, key
         api_key (str): Your YouTube Data API key.
         yt_channels (Optional[List[str]]): List of YouTube channel names or IDs to fetch videos from.
         yt_playlists (Optional[List[str]]): List of YouTube playlist IDs to fetch videos from.
-        keywords (List[str]): Keywords to filter videos by.
-        keywords_to_exclude (List[str]): Keywords to exclude videos by.
+        filter_rules (FilterRules): The title filtering rules evaluated for each new video.
         fetch_videos (bool): Whether to fetch videos or not.
-
-    Returns:
-        List[dict]: A list of dictionaries containing video information.
+        full_resync (bool): Whether to list every channel's uploads from scratch instead of stopping at the last sync.
     """
     service_account_file = os.environ.get('SERVICE_ACCOUNT_FILE')
     credentials = None
@@ -208,55 +211,71 @@ async def fetch_youtube_videos(api_key, yt_channels, yt_playlists, keywords, key
 
     csv_file_exists, csv_file_path, headers = setup_csv()
 
-    existing_data, existing_video_names, existing_channel_names = load_existing_data(csv_file_exists, csv_file_path)
+    # Loaded once per run and shared by every channel and playlist
+    catalog = VideoCatalog.load(csv_file_path)
+
+    # Channels already in the catalog are listed first, video titles are looked up through the catalog itself
+    existing_channel_names = catalog.channel_names()
 
-    channel_handle_to_name = get_channel_names(api_key, yt_channels)
+    # Channel ID, title and uploads playlist ID per handle, resolved once and cached in MAPPING_FILE_PATH
+    channels = resolve_channel_handles(credentials, api_key, yt_channels or [])
+    channel_handle_to_name = {channel_handle: channel['channel_name'] for channel_handle, channel in channels.items()}
 
     channels_in_csv, channels_not_in_csv = separate_channels_based_on_csv(channel_handle_to_name, existing_channel_names, yt_channels)
 
     if fetch_videos:
-        await fetch_channel_videos(api_key, channel_handle_to_name, channels_in_csv, channels_not_in_csv, credentials, csv_file_path, existing_video_names, headers, yt_channels, PASSTHROUGH)
-
-        await fetch_playlist_videos(api_key, credentials, csv_file_path, existing_video_names, headers, yt_playlists)
-
-    return existing_data
-
-
-async def fetch_playlist_videos(api_key, credentials, csv_file_path, existing_video_names, headers, yt_playlists):
+        # The channel and playlist paths run concurrently and share one append-only writer per store
+        sync_state = ChannelSyncState.load(CHANNEL_SYNC_STATE_FILE_PATH, full_resync=full_resync)
+        filtered_away_catalog = setup_filtered_away_csv()
+        with CatalogWriter(csv_file_path, catalog, headers) as catalog_writer, \
+                CatalogWriter(FILTERED_AWAY_CSV_FILE_PATH, filtered_away_catalog, headers) as filtered_away_writer:
+            await asyncio.gather(
+                fetch_channel_videos(api_key, channels, channels_in_csv, channels_not_in_csv, credentials, catalog_writer, filtered_away_writer, yt_channels, filter_rules, sync_state),
+                fetch_playlist_videos(api_key, credentials, catalog_writer, filtered_away_writer, filter_rules, yt_playlists),
+            )
+
+
+async def fetch_playlist_videos(api_key, credentials, catalog_writer: CatalogWriter, filtered_away_writer: CatalogWriter, filter_rules: FilterRules, yt_playlists):
     if yt_playlists:
         for playlist_id in yt_playlists:
-            video_info_list = get_videos_from_playlist(credentials, api_key, playlist_id)
-            save_video_info_to_csv(video_info_list, csv_file_path, existing_video_names, headers)
+            video_info_list = await asyncio.to_thread(get_videos_from_playlist, credentials, api_key, playlist_id)
+            save_video_info_to_csv(filter_rules.annotate(video_info_list), catalog_writer, filtered_away_writer)
 
 
-async def fetch_channel_videos(api_key, channel_handle_to_name, channels_in_csv, channels_not_in_csv, credentials, csv_file_path, existing_video_names, headers, yt_channels, PASSTHROUGH):
-    # Load existing mappings if the file exists, or initialize an empty dictionary
-    channel_name_to_id = {}  # Initialize regardless
-    if os.path.exists(MAPPING_FILE_PATH):
-        with open(MAPPING_FILE_PATH, 'r', encoding='utf-8') as file:
-            channel_name_to_id = json.load(file)
-    else:
-        # Here, the file does not exist, so we're creating a new one with empty data.
-        # This ensures that a file is present from this point forward.
-        with open(MAPPING_FILE_PATH, 'w', encoding='utf-8') as file:
-            json.dump(channel_name_to_id, file, ensure_ascii=False, indent=4)
+async def fetch_channel_videos(api_key, channels, channels_in_csv, channels_not_in_csv, credentials, catalog_writer: CatalogWriter, filtered_away_writer: CatalogWriter, yt_channels, filter_rules: FilterRules, sync_state: ChannelSyncState,
+                               max_concurrent_channels: int = int(os.environ.get('YOUTUBE_MAX_CONCURRENT_CHANNELS', 8))):
+    # At most max_concurrent_channels channels are listed at once, each one's rows are saved as soon as it finishes
+    semaphore = asyncio.Semaphore(max_concurrent_channels)
+
+    async def process_channel(channel_handle, channel, fetcher):
+        async with semaphore:
+            try:
+                added_videos = await fetch_and_save_channel_videos_async(fetcher, channel, credentials, api_key, catalog_writer, filtered_away_writer, filter_rules, sync_state)
+                return channel_handle, added_videos, None
+            except Exception as e:
+                # A failing channel must not take the others down, its high-water mark is left untouched
+                logging.error(f"[{channel['channel_name']}] Error occurred while fetching the channel videos. Error: {e}")
+                return channel_handle, 0, e
 
     async with aiohttp.ClientSession() as session:
+        # Shared across channels so that the in-flight limit applies to the whole run
+        fetcher = VideosListFetcher(session, api_key, credentials)
         # This part of the logic is kept as originally intended, processing the channels based on whether they are in the CSV or not
-        all_channels = set(channels_in_csv + channels_not_in_csv)  # Avoid duplicate channel processing
-        for channel_handle in all_channels:
-            channel_name = channel_handle_to_name.get(channel_handle)
-            if channel_name:
-                # Retrieve the channel ID, either from the mapping or by requesting it
-                channel_id = await get_channel_id(session, api_key, channel_handle, channel_name_to_id)
-                if channel_id:
-                    # Your existing method to fetch and save videos
-                    # session, channel_id, channel_name, credentials, api_key, csv_file_path, existing_video_names, headers
-                    await fetch_and_save_channel_videos_async(session, channel_id, channel_name, credentials, api_key, csv_file_path, existing_video_names, headers, PASSTHROUGH)
-
-    # After processing all channels, save the potentially updated mapping back to the file
-    with open(MAPPING_FILE_PATH, 'w', encoding='utf-8') as file:
-        json.dump(channel_name_to_id, file, ensure_ascii=False, indent=4)
+        all_channels = dict.fromkeys(channels_in_csv + channels_not_in_csv)  # Avoid duplicate channel processing
+        tasks = [process_channel(channel_handle, channels[channel_handle], fetcher) for channel_handle in all_channels if channel_handle in channels]
+
+        added_per_channel, failed_channels = {}, {}
+        for finished in asyncio.as_completed(tasks):
+            channel_handle, added_videos, error = await finished
+            if error is None:
+                added_per_channel[channel_handle] = added_videos
+            else:
+                failed_channels[channel_handle] = error
+
+    logging.info(f"Channel fetch summary: {len(added_per_channel)} channels succeeded with {sum(added_per_channel.values())} new videos, {len(failed_channels)} failed.")
+    for channel_handle, error in failed_channels.items():
+        logging.warning(f"[{channel_handle}] failed: {type(error).__name__}: {error}")
+    get_quota_scheduler().log_spending()
 
 
 def separate_channels_based_on_csv(channel_handle_to_name, existing_channel_names, yt_channels):
@@ -274,59 +293,10 @@ def separate_channels_based_on_csv(channel_handle_to_name, existing_channel_name
     return channels_in_csv, channels_not_in_csv
 
 
-def get_channel_names(api_key, yt_channels):
-    # Check if mapping file exists, if so, load it
-    if os.path.exists(MAPPING_FILE_PATH):
-        with open(MAPPING_FILE_PATH, 'r', encoding='utf-8') as file:
-            channel_handle_to_name = json.load(file)
-    else:
-        channel_handle_to_name = {}
-
-    # Check if any channel handles are missing in the loaded/existing mapping, and fetch those
-    missing_handles = [handle for handle in yt_channels if handle not in channel_handle_to_name]
-
-    for channel_handle in missing_handles:
-        channel_name = get_channel_name(api_key, channel_handle)
-        if channel_name:
-            # Check if the channel name starts with "=" and wrap it in triple quotes if so
-            if channel_name.startswith("="):
-                channel_name = f'"""{channel_name}"""'
-            channel_handle_to_name[channel_handle] = channel_name
-            logging.info(f"[{channel_handle}] added channel name: {channel_name}")
-
-    # Save the updated mapping to file
-    with open(MAPPING_FILE_PATH, 'w', encoding='utf-8') as file:
-        json.dump(channel_handle_to_name, file, ensure_ascii=False, indent=4)
-
-    return channel_handle_to_name
-
-
-def load_existing_data(csv_file_exists, csv_file_path):
-    # Create a DataFrame to store existing data read from the CSV file and create sets of existing video names and channel names
-    if csv_file_exists:
-        existing_data_df = pd.read_csv(csv_file_path, encoding='utf-8')
-
-        # Create a set for existing video names for faster lookup
-        existing_video_names = set(existing_data_df['title'].str.strip())
-
-        # Create a set for existing channel names for faster lookup
-        existing_channel_names = set(existing_data_df['channel_name'].str.strip())
-
-        # Convert the DataFrame back to a list of dictionaries to create existing_data
-        existing_data = existing_data_df.to_dict('records')
-    else:
-        # If the CSV file does not exist, initialize empty sets and list
-        existing_data = []
-        existing_video_names = set()
-        existing_channel_names = set()
-
-    return existing_data, existing_video_names, existing_channel_names
-
-
 def setup_csv():
     # Check if the CSV file already exists
     csv_file_exists = os.path.exists(YOUTUBE_VIDEOS_CSV_FILE_PATH)
-    headers = ['title', 'channel_name', 'published_date', 'url']
+    headers = CATALOG_HEADERS
 
     # Ensure the directory exists
     os.makedirs(os.path.dirname(YOUTUBE_VIDEOS_CSV_FILE_PATH), exist_ok=True)
@@ -336,7 +306,10 @@ def setup_csv():
         existing_data_df = pd.read_csv(YOUTUBE_VIDEOS_CSV_FILE_PATH, encoding='utf-8', nrows=0)  # Read just the header
         existing_headers = existing_data_df.columns.tolist()
 
-        if existing_headers != headers:
+        if existing_headers != headers and 'url' in existing_headers and set(existing_headers) < set(headers):
+            # Catalog written by an earlier version, add the missing columns and backfill the IDs from the URLs
+            migrate_catalog_schema(YOUTUBE_VIDEOS_CSV_FILE_PATH)
+        elif existing_headers != headers:
             # Create a new CSV file with the specified headers
             pd.DataFrame(columns=headers).to_csv(YOUTUBE_VIDEOS_CSV_FILE_PATH, index=False, encoding='utf-8')
     else:
@@ -346,82 +319,24 @@ def setup_csv():
     return csv_file_exists, YOUTUBE_VIDEOS_CSV_FILE_PATH, headers
 
 
-def drop_duplicates_and_write_to_csv(filtered_away_csv_file_path, filtered_away_video_info_list, headers):
-    # Load current CSV data
-    existing_rows = []
-    if os.path.exists(filtered_away_csv_file_path):
-        with open(filtered_away_csv_file_path, 'r', newline='', encoding='utf-8') as csv_file:
-            reader = csv.DictReader(csv_file)
-            existing_rows = [row for row in reader]
-
-    # Combine the existing rows with the new rows, and remove duplicates
-    all_rows = existing_rows + filtered_away_video_info_list
-    deduplicated_rows = {row['url']: row for row in all_rows}.values()
-
-    # Write the deduplicated rows back to the CSV file
-    with open(filtered_away_csv_file_path, 'w', newline='', encoding='utf-8') as csv_file:
-        writer = csv.DictWriter(csv_file, fieldnames=headers)
-        writer.writeheader()
-        writer.writerows(deduplicated_rows)
-
+def setup_filtered_away_csv() -> VideoCatalog:
+    # The filtered-away store shares the catalog's headers, a store written by an earlier version is migrated first
+    if os.path.exists(FILTERED_AWAY_CSV_FILE_PATH) and os.path.getsize(FILTERED_AWAY_CSV_FILE_PATH) > 0:
+        migrate_catalog_schema(FILTERED_AWAY_CSV_FILE_PATH)
+    return VideoCatalog.load(FILTERED_AWAY_CSV_FILE_PATH)
 
-def filter_and_remove_videos(input_csv_path, keywords, keywords_to_exclude, PASSTHROUGH, channel_specific_filters=None):
-    # Read the CSV file into a DataFrame
-    if channel_specific_filters is None:
-        channel_specific_filters = {}
-    df = pd.read_csv(input_csv_path)
 
-    # Separate rows corresponding to channels in PASSTHROUGH
-    passthrough_df = df[df['channel_name'].str.lower().isin([channel.lower() for channel in PASSTHROUGH])]
-    non_passthrough_df = df[~df['channel_name'].str.lower().isin([channel.lower() for channel in PASSTHROUGH])]
-
-    # Apply global keyword filtering only to non-PASSTHROUGH channels
-    global_filtered_df = non_passthrough_df[non_passthrough_df['title'].str.lower().str.contains('|'.join(keywords).lower(), na=False)]
-
-    # Filter out titles from passthrough_df that contain any of the keywords_to_exclude
-    passthrough_df = passthrough_df[~passthrough_df['title'].str.lower().str.contains('|'.join(keywords_to_exclude).lower(), na=False)]
-
-    # Concatenate PASSTHROUGH and non-PASSTHROUGH videos
-    global_filtered_df = pd.concat([global_filtered_df, passthrough_df])
-
-    # Convert keys in channel_specific_filters to lowercase
-    channel_specific_filters = {channel.lower(): filters for channel, filters in channel_specific_filters.items()}
-
-    # Initialize DataFrame for final filtered videos
-    final_filtered_df = pd.DataFrame()
-
-    # Identify the channels in the DataFrame that have channel-specific filters
-    channels_with_specific_filters = set(global_filtered_df['channel_name'].str.lower()) & set(channel_specific_filters.keys())
-
-    # Apply channel-specific keyword filtering to the channels identified
-    for channel in channels_with_specific_filters:
-        channel_keywords = channel_specific_filters[channel]
-        channel_df = global_filtered_df[global_filtered_df['channel_name'].str.lower() == channel]
-        channel_filtered_df = channel_df[channel_df['title'].str.lower().str.contains('|'.join(channel_keywords).lower(), na=False)]
-        final_filtered_df = pd.concat([final_filtered_df, channel_filtered_df])
-
-    # Concatenate videos from channels that did not have channel-specific filters
-    final_filtered_df = pd.concat([final_filtered_df, global_filtered_df[~global_filtered_df['channel_name'].str.lower().isin(channels_with_specific_filters)]])
-
-    # Identify removed videos
-    removed_df = df[~df['title'].isin(final_filtered_df['title'])]
-
-    # Log the removed video titles
-    for _, removed_video in removed_df.iterrows():
-        logging.info(f"Removed video: {removed_video['title']} - Channel: {removed_video['channel_name']}")
-
-    # Append removed videos to filtered_away_youtube_videos.csv
-    filtered_away_csv_file_path = f"{root_directory()}/data/links/youtube/filtered_away_youtube_videos.csv"
-    write_filtered_away_header = not os.path.exists(filtered_away_csv_file_path)
-    removed_df.to_csv(filtered_away_csv_file_path, mode='a', header=write_filtered_away_header, index=False)
-
-    # Write the filtered data back to the CSV file
-    final_filtered_df.to_csv(input_csv_path, index=False)
+def filter_and_remove_videos(input_csv_path, filter_rules: FilterRules) -> FilterDiff:
+    # Moves the videos the rules now remove to the filtered-away store and those they keep again back to the catalog.
+    # A no-op when neither the rules nor the catalog changed since the last filtering.
+    diff = refilter_catalog(filter_rules, input_csv_path, FILTERED_AWAY_CSV_FILE_PATH)
+    logging.info(f"Filter rules {filter_rules.version}: {format_filter_diff(diff)}")
+    return diff
 
 
 async def fetch_all_videos(api_key: str, yt_channels: Optional[List[str]] = None, yt_playlists: Optional[List[str]] = None,
-              keywords: List[str] = None, keywords_to_exclude: List[str] = None, PASSTHROUGH: List[str] = None, fetch_videos: bool = True):
-    await fetch_youtube_videos(api_key, yt_channels, yt_playlists, keywords, keywords_to_exclude, PASSTHROUGH, fetch_videos)
+              filter_rules: Optional[FilterRules] = None, fetch_videos: bool = True, full_resync: bool = False):
+    await fetch_youtube_videos(api_key, yt_channels, yt_playlists, filter_rules or get_filter_rules(), fetch_videos, full_resync=full_resync)
 
 
 # Function to read the channel handles from a file
@@ -431,15 +346,11 @@ def get_youtube_channels_from_file(file_path):
     return channels
 
 
-def run():
-    fetch_videos = True
-
-    PASSTHROUGH = ['Flashbots']  # do not apply any filtering to these channels
+def run(full_resync=False, refilter_only=False):
+    fetch_videos = not refilter_only
 
-    # Define the channel-specific filters which are applied after the first keyword selection
-    channel_specific_filters = {
-        "Bankless": ["MEV", "maximal extractable value", "How They Solved Ethereum's Critical Flaw", "zk"] + AUTHORS + FIRMS,
-    }
+    # PASSTHROUGH channels, keywords and channel-specific filters are all declared in FILTER_RULES_FILE_PATH
+    filter_rules = get_filter_rules()
 
     if not fetch_videos:
         logging.info(f"Applying new filters only, not fetching videos.")
@@ -460,20 +371,18 @@ def run():
             raise ValueError(
                 "No channels or playlists provided. Please provide channel names, IDs, or playlist IDs via command line argument or .env file.")
 
-        asyncio.run(fetch_all_videos(api_key, yt_channels, yt_playlists, KEYWORDS_TO_INCLUDE, KEYWORDS_TO_EXCLUDE, PASSTHROUGH, fetch_videos=True))
+        asyncio.run(fetch_all_videos(api_key, yt_channels, yt_playlists, filter_rules, fetch_videos=True, full_resync=full_resync))
 
-    # Call the filter_and_log_removed_videos method to filter and log removed videos
-    filter_and_remove_videos(YOUTUBE_VIDEOS_CSV_FILE_PATH, KEYWORDS_TO_INCLUDE, KEYWORDS_TO_EXCLUDE, PASSTHROUGH, channel_specific_filters)
-
-    # Load CSV into a pandas DataFrame
-    df = pd.read_csv(YOUTUBE_VIDEOS_CSV_FILE_PATH, delimiter=',')
-
-    # Drop duplicates
-    df.drop_duplicates(inplace=True)
-
-    # Optionally, save the cleaned data back to the CSV
-    df.to_csv(YOUTUBE_VIDEOS_CSV_FILE_PATH, index=False)
+    # Apply the rules to the catalog, which also drops duplicated video IDs whenever the catalog is rewritten
+    diff = filter_and_remove_videos(YOUTUBE_VIDEOS_CSV_FILE_PATH, filter_rules)
+    if refilter_only:
+        print(format_filter_diff(diff))
 
 
 if __name__ == '__main__':
-    run()
+    parser = argparse.ArgumentParser(description='Fetch YouTube video details from channel handles.')
+    parser.add_argument('--full-resync', action='store_true', help='List every channel from scratch instead of stopping at the last synced upload')
+    parser.add_argument('--refilter-only', action='store_true', help='Apply the current filter rules to the catalog without fetching, and print the diff')
+    args = parser.parse_args()
+
+    run(full_resync=args.full_resync, refilter_only=args.refilter_only)
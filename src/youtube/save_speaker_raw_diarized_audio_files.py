@@ -2,12 +2,17 @@ import json
 import logging
 import os
 import re
+import shutil
 import time
 import random
 from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, List, Tuple
 from dotenv import load_dotenv
 
 from src.constants_and_keywords_to_filter import YOUTUBE_VIDEO_DIRECTORY
+from src.utils.artifact_index import record_artifact
+from src.utils.audio_store import AudioStore
+from src.utils.transcode import AUDIO_FILE_EXTENSIONS
 
 load_dotenv()
 api_keys = os.environ.get('ASSEMBLY_AI_API_KEYS')  # Expecting a comma-separated list of API keys
@@ -60,6 +65,62 @@ def utterance_to_dict(utterance) -> dict:
     }
 
 
+def transcript_path(audio_file_path: str) -> str:
+    return os.path.splitext(audio_file_path)[0] + "_diarized_content.json"
+
+
+def deduplicate_audio_files(file_paths: List[str], audio_store: AudioStore) -> Tuple[List[str], Dict[str, List[str]]]:
+    """
+    Picks one audio file to diarize per distinct audio stream, so that episodes downloaded twice or cross-posted
+    with the same audio are diarized once.
+
+    Audio that was diarized under any title the audio store has seen, e.g. on an earlier run, is not diarized again.
+    Files are compared by the hash of their audio stream, so a re-upload that YouTube encoded separately is not
+    recognized and is diarized on its own.
+
+    Args:
+        file_paths (List[str]): The audio files found in the dataset tree.
+        audio_store (AudioStore): The content-addressed audio store, files not in it yet are added.
+
+    Returns:
+        Tuple[List[str], Dict[str, List[str]]]: The files to diarize, and per file whose transcript is or will be
+            available, the files without a transcript that have the same audio.
+    """
+    to_diarize, duplicates = [], {}
+    for digest, group in audio_store.group_by_content(file_paths).items():
+        diarized = next((path for path in audio_store.paths(digest) + group if os.path.exists(transcript_path(path))), None)
+        primary = diarized or group[0]
+        if diarized is None:
+            to_diarize.append(primary)
+        others = [path for path in group if path != primary and not os.path.exists(transcript_path(path))]
+        if others:
+            duplicates[primary] = others
+    return to_diarize, duplicates
+
+
+def share_transcripts(duplicates: Dict[str, List[str]]) -> int:
+    """
+    Links the transcript of each diarized file next to the files with the same audio, copying it if links are not
+    supported. Returns the number of transcripts shared.
+    """
+    shared = 0
+    for primary, others in duplicates.items():
+        source = transcript_path(primary)
+        if not os.path.exists(source):
+            continue
+        for other in others:
+            destination = transcript_path(other)
+            if os.path.exists(destination):
+                continue
+            try:
+                os.link(source, destination)
+            except OSError:
+                shutil.copyfile(source, destination)
+            record_artifact(destination)
+            shared += 1
+    return shared
+
+
 def transcribe_and_save(api_key_file_path):
     api_key, file_path = api_key_file_path
     set_api_key(api_key)
@@ -68,7 +129,7 @@ def transcribe_and_save(api_key_file_path):
         transcript_file_path = os.path.splitext(file_path)[0] + "_diarized_content.json"
 
         if os.path.exists(transcript_file_path):
-            logging.info(f"Content for {file_path.split('/')[-1].replace('.mp3', '.json')} already diarized. Skipping.")
+            logging.info(f"Content for {os.path.basename(transcript_file_path)} already diarized. Skipping.")
             return
 
         if not os.path.exists(file_path):
@@ -101,6 +162,7 @@ def transcribe_and_save(api_key_file_path):
 
         with open(transcript_file_path, 'w') as file:
             json.dump(utterances_dicts, file, indent=4)
+        record_artifact(transcript_file_path)
 
         logging.info(f"Transcript for [{channel_name}/{file_name}] saved to [{channel_name}/{transcript_file_name}]")
 
@@ -124,19 +186,25 @@ def main():
     api_keys = api_keys.split(',')
 
     data_path = YOUTUBE_VIDEO_DIRECTORY
-    mp3_files = [os.path.join(root, file) for root, _, files in os.walk(data_path) for file in files if file.endswith(".mp3") and is_valid_filename(file)]
+    # Native opus/m4a audio is diarized as it is when the download stage ran without transcoding
+    mp3_files = [os.path.join(root, file) for root, _, files in os.walk(data_path) for file in files if file.endswith(AUDIO_FILE_EXTENSIONS) and is_valid_filename(file)]
+
+    # Audio files with the same audio stream, downloaded twice or cross-posted, are diarized once and share the transcript
+    mp3_files, duplicates = deduplicate_audio_files(mp3_files, AudioStore.load())
+    logging.info(f"Shared {share_transcripts(duplicates)} existing transcripts with duplicate audio files, {len(mp3_files)} distinct audio files to diarize")
     if not mp3_files:
-        logging.warning("No MP3 files found to transcribe.")
+        logging.warning("No audio files left to transcribe.")
         return
 
-    # Split files evenly among API keys
-    files_per_key = len(mp3_files) // len(api_keys)
+    # Split files evenly among API keys, rounding up so that no file is left out and no chunk is diarized twice
+    files_per_key = -(-len(mp3_files) // len(api_keys))
     file_chunks = [mp3_files[i:i + files_per_key] for i in range(0, len(mp3_files), files_per_key)]
 
-    with ProcessPoolExecutor(max_workers=len(api_keys)) as executor:
-        futures = [executor.submit(worker, api_key, file_chunks[i % len(file_chunks)]) for i, api_key in enumerate(api_keys)]
+    with ProcessPoolExecutor(max_workers=len(file_chunks)) as executor:
+        futures = [executor.submit(worker, api_key, file_chunk) for api_key, file_chunk in zip(api_keys, file_chunks)]
         for future in futures:
             future.result()  # Wait for all futures to complete, handling any exceptions.
+    logging.info(f"Shared {share_transcripts(duplicates)} new transcripts with duplicate audio files")
 
 
 if __name__ == "__main__":